@@ -1 +1 @@
-from .src import *
\ No newline at end of file
+from .src import __all__, __dir__, __getattr__
\ No newline at end of file
@@ -1,12 +1,143 @@
-from .archetype import *
-from .card import *
-from .cardbuilder import *
-from .cardrenderer import *
-from .constants import *
-from .deck import *
-from .enums import *
-from .functions import *
-from .omegadb import *
-from .set import *
-from .sqlclasses import *
-from .yugidb import *
+from importlib import import_module
+
+# Public names of each submodule. Submodules are imported the first time one
+# of their names is accessed, so using Deck or Card alone does not load
+# SQLAlchemy, NumPy, Pillow or requests.
+_SUBMODULES = {
+    "archetype": ["Archetype", "ARCHETYPE_SCHEMA", "archetypes_to_records"],
+    "asyncyugidb": ["ASYNC_POOL_SIZE", "AsyncYugiDB", "AsyncOmegaDB"],
+    "card": ["ua", "Card", "CARD_SCHEMA", "cards_to_records", "PartialCard"],
+    "cardbuilder": ["CardBuilder"],
+    "cardrenderer": ["IMG_BASE_URL", "CARD_SIZE", "ASSET_DIR", "Renderer"],
+    "cardtable": ["CARD_TABLE_FIELDS", "CARD_TABLE_OBJECT_FIELDS", "CardTable"],
+    "columnar": ["COLUMNAR_OPS", "text_column", "like_mask", "ColumnarEngine"],
+    "constants": [
+        "archetype_roles",
+        "card_filter_params",
+        "fulltext_filter_params",
+        "archetype_filter_params",
+        "set_filter_params",
+        "columnar_filter_params",
+        "card_order_params",
+        "columnar_order_params",
+        "card_fields",
+        "card_projections",
+    ],
+    "deck": [
+        "MAIN_DECK_MIN_SIZE",
+        "MAIN_DECK_MAX_SIZE",
+        "EXTRA_DECK_MAX_SIZE",
+        "SIDE_DECK_MAX_SIZE",
+        "Deck",
+    ],
+    "diff": ["CARD_TABLES", "DatabaseDelta", "diff_databases"],
+    "enums": [
+        "Type",
+        "LinkMarker",
+        "Race",
+        "Attribute",
+        "Category",
+        "Genre",
+        "Status",
+        "Rarity",
+    ],
+    "exporter": [
+        "ExportFormat",
+        "EXPORT_CHUNK_SIZE",
+        "EXPORT_FIELDS",
+        "EXPORT_FIELD_TYPES",
+        "guess_export_format",
+        "export_cards",
+    ],
+    "federateddb": ["FederatedDB"],
+    "functions": [
+        "rescue_hedgehog",
+        "numbers_eveil",
+        "duality",
+        "union_activation",
+        "union_controller",
+        "seventh_tachyon",
+    ],
+    "importer": [
+        "ImportFormat",
+        "ENUM_FIELDS",
+        "LIST_FIELDS",
+        "guess_format",
+        "read_records",
+        "decode_records",
+    ],
+    "omegadb": ["OMEGA_BASE_URL", "DOWNLOAD_CHUNK_SIZE", "DOWNLOAD_TIMEOUT", "OmegaDB"],
+    "records": ["RecordSchema", "select_fields", "to_records"],
+    "scripts": [
+        "SCRIPT_BASE_URL",
+        "SCRIPT_DIR",
+        "SCRIPT_TIMEOUT",
+        "SCRIPT_WORKERS",
+        "ScriptCache",
+        "get_script_cache",
+        "set_script_cache",
+    ],
+    "set": ["Set", "SET_SCHEMA", "sets_to_records"],
+    "snapshot": [
+        "SNAPSHOT_MAGIC",
+        "SNAPSHOT_VERSION",
+        "SNAPSHOT_HEADER",
+        "SNAPSHOT_DTYPE",
+        "SCRIPT_NULL",
+        "SCRIPT_INT",
+        "SCRIPT_BYTES",
+        "SCRIPT_STR",
+        "SNAPSHOT_STRINGS",
+        "write_snapshot",
+        "CardSnapshot",
+    ],
+    "sqlclasses": [
+        "Base",
+        "Datas",
+        "Texts",
+        "Koids",
+        "Setcodes",
+        "Packs",
+        "Relations",
+        "Rarities",
+        "CardArchetypes",
+        "TextsFts",
+    ],
+    "yugidb": [
+        "Cardquery",
+        "QUERY_PLAN_CACHE_SIZE",
+        "WRITE_CHUNK_SIZE",
+        "IMPORT_CHUNK_SIZE",
+        "ITER_CHUNK_SIZE",
+        "CARD_CACHE_SIZE",
+        "IMPORT_TABLES",
+        "READ_PRAGMAS",
+        "OpenMode",
+        "TEXT_INDEX_TRIGGERS",
+        "ARCHETYPE_INDEX_TRIGGERS",
+        "TEXT_INDEX_MIN_PHRASE",
+        "WriteResult",
+        "YugiDB",
+    ],
+}
+
+_NAMES = {name: module for module, names in _SUBMODULES.items() for name in names}
+
+# Names left out of star imports, ua would load fake_useragent right away
+_LAZY_ONLY = ["ua"]
+
+__all__ = [name for name in _NAMES if name not in _LAZY_ONLY]
+
+
+def __getattr__(name: str):
+    if name not in _NAMES:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+    value = getattr(import_module(f".{_NAMES[name]}", __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__() -> list[str]:
+    # set is shadowed by the set submodule once it has been imported
+    return sorted({*globals(), *_NAMES})
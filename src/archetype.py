@@ -1,4 +1,8 @@
 from dataclasses import dataclass
+from operator import attrgetter
+from typing import Iterable
+
+from .records import to_records
 
 
 @dataclass()
@@ -22,13 +26,7 @@ class Archetype:
         return card_id in self.combined_cards
 
     def to_dict(self) -> dict:
-        return {
-            "id": self.id,
-            "name": self.name,
-            "members": self.members,
-            "support": self.support,
-            "related": self.related,
-        }
+        return {key: get(self) for key, get in ARCHETYPE_SCHEMA}
 
     @property
     def members(self):
@@ -51,3 +49,20 @@ class Archetype:
     @property
     def combined_cards(self) -> list[int]:
         return list(set(self.members + self.support + self.related))
+
+
+ARCHETYPE_SCHEMA = [
+    ("id", attrgetter("id")),
+    ("name", attrgetter("name")),
+    ("members", attrgetter("members")),
+    ("support", attrgetter("support")),
+    ("related", attrgetter("related")),
+]
+
+
+def archetypes_to_records(
+    archetypes: Iterable[Archetype],
+    fields: Iterable[str] | None = None,
+    as_json: bool = False,
+) -> list[dict] | bytes:
+    return to_records(archetypes, ARCHETYPE_SCHEMA, fields, as_json)
@@ -0,0 +1,291 @@
+from copy import copy
+from typing import Iterable, Literal
+
+from sqlalchemy import event, func, or_, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+from .archetype import Archetype
+from .card import Card
+from .constants import *
+from .enums import *
+from .omegadb import OMEGA_BASE_URL, OmegaDB
+from .set import Set
+from .sqlclasses import *
+from .util import escape_like
+from .yugidb import (
+    CARD_CACHE_SIZE,
+    READ_PRAGMAS,
+    TEXT_INDEX_MIN_PHRASE,
+    OpenMode,
+    YugiDB,
+)
+
+ASYNC_POOL_SIZE = 5
+
+
+class AsyncYugiDB:
+    """Awaitable card, archetype and set lookups over an aiosqlite engine.
+
+    Queries are built by a regular YugiDB, which also builds the derived
+    tables when the database is opened, and executed on pooled connections
+    so independent lookups can run concurrently.
+    """
+
+    def __init__(
+        self,
+        connection_string: str,
+        columnar: bool = False,
+        mode: OpenMode = "readwrite",
+        card_cache_size: int = CARD_CACHE_SIZE,
+        pool_size: int = ASYNC_POOL_SIZE,
+    ):
+        db = YugiDB(connection_string, columnar, mode, card_cache_size)
+        self._setup(db, connection_string, pool_size)
+
+    def _setup(self, db: YugiDB, connection_string: str, pool_size: int):
+        self.db = db
+        self.name = db.name
+        self.engine = self._create_engine(connection_string, db.mode, pool_size)
+
+    @staticmethod
+    def _create_engine(connection_string: str, mode: OpenMode, pool_size: int):
+        url = make_url(connection_string).set(drivername="sqlite+aiosqlite")
+
+        if mode == "memory":
+            raise ValueError("Open mode 'memory' is not supported for AsyncYugiDB")
+        elif mode == "immutable":
+            url = url.set(
+                database=f"file:{url.database}",
+                query={"mode": "ro", "immutable": "1", "uri": "true"},
+            )
+
+        engine = create_async_engine(
+            url, poolclass=AsyncAdaptedQueuePool, pool_size=pool_size
+        )
+
+        if mode != "readwrite":
+
+            @event.listens_for(engine.sync_engine, "connect")
+            def set_pragmas(dbapi_connection, _):
+                cursor = dbapi_connection.cursor()
+                for pragma, value in READ_PRAGMAS.items():
+                    cursor.execute(f"PRAGMA {pragma} = {value}")
+                cursor.close()
+
+        return engine
+
+    async def close(self):
+        await self.engine.dispose()
+
+    async def _execute(self, query):
+        # Each call checks out its own connection from the pool
+        async with self.engine.connect() as connection:
+            return await connection.execute(query.statement)
+
+    async def _all(self, query) -> list:
+        return (await self._execute(query)).all()
+
+    async def _one_or_none(self, query):
+        return (await self._execute(query)).one_or_none()
+
+    ################# Card Functions #################
+
+    async def cards(self) -> list[Card]:
+        results = await self._all(self.db.card_query)
+        return self.db._make_card_list(results)
+
+    async def get_archetype_cards(self, arch: Archetype) -> list[Card]:
+        query = self.db.card_query.filter(self.db._archetype_filter(arch.id))
+        return self.db._make_card_list(await self._all(query))
+
+    async def get_set_cards(self, set: Set) -> list[Card]:
+        query = self.db.card_query.join(Relations, Datas.id == Relations.cardid).filter(
+            Relations.packid == set.id
+        )
+        return self.db._make_card_list(await self._all(query))
+
+    async def get_cards_by_value(
+        self, key: str, value: str | IntFlag | list[IntFlag]
+    ) -> list[Card]:
+        return await self.get_cards_by_values({key: value})
+
+    async def get_cards_by_values(
+        self,
+        params: dict,
+        limit: int | None = None,
+        offset: int | None = None,
+        order_by: str | None = None,
+        after: Card | None = None,
+        projection: str | Iterable[str] | None = None,
+    ) -> list[Card]:
+        # Deferred fields of lean cards are loaded synchronously through self.db
+        if self.db.columnar:
+            return self.db.columnar_engine.get_cards_by_values(
+                params, limit, offset, order_by, after
+            )
+
+        fields = self.db._projection_fields(projection)
+        query = self.db._query_by_values(
+            "card_query", self.db._card_filter_params, params, fields
+        )
+        if limit is not None or offset or order_by or after is not None:
+            query = self.db._paginate(query, limit, offset, order_by, after)
+        return self.db._make_card_list(await self._all(query), fields)
+
+    async def count_cards_by_values(self, params: dict) -> int:
+        if self.db.columnar:
+            return self.db.columnar_engine.count_cards_by_values(params)
+
+        query = self.db._query_by_values(
+            "card_count_query", self.db._card_filter_params, params
+        )
+        return (await self._execute(query)).scalar()
+
+    async def search_cards(self, phrase: str, limit: int | None = None) -> list[Card]:
+        if not self.db.has_text_index or len(phrase) < TEXT_INDEX_MIN_PHRASE:
+            pattern = f"%{escape_like(phrase)}%"
+            query = self.db.card_query.filter(
+                or_(
+                    Texts.name.ilike(pattern, escape="\\"),
+                    Texts.desc.ilike(pattern, escape="\\"),
+                )
+            ).limit(limit)
+            return self.db._make_card_list(await self._all(query))
+
+        async with self.engine.connect() as connection:
+            ranked = await connection.execute(
+                text(
+                    "SELECT rowid FROM texts_fts WHERE texts_fts MATCH :phrase "
+                    "ORDER BY bm25(texts_fts, 10.0, 1.0) LIMIT :limit"
+                ),
+                {"phrase": '"%s"' % phrase.replace('"', '""'), "limit": limit or -1},
+            )
+        card_ids = [card_id for card_id, in ranked]
+        cards = {card.id: card for card in await self.get_cards_by_ids(card_ids)}
+        return [cards[card_id] for card_id in card_ids if card_id in cards]
+
+    async def get_card_by_id(self, card_id) -> Card | None:
+        cards = await self.get_cards_by_ids([card_id])
+        return cards[0] if cards else None
+
+    async def get_cards_by_ids(self, card_ids) -> list[Card]:
+        cache = self.db.card_cache
+        cards = {}
+        missing = []
+        for card_id in sorted(set(int(card_id) for card_id in card_ids)):
+            card = cache.get(card_id)
+            if card is None:
+                missing.append(card_id)
+            else:
+                cards[card_id] = card
+
+        if missing:
+            query = self.db.card_query.filter(Datas.id.in_(missing))
+            for card in self.db._make_card_list(await self._all(query)):
+                cache.put(card.id, card)
+                cards[card.id] = card
+
+        return [copy(cards[card_id]) for card_id in sorted(cards)]
+
+    async def get_card_by_name(self, card_name: str) -> Card | None:
+        query = self.db.card_query.filter(func.lower(Texts.name) == card_name.lower())
+        result = (await self._execute(query)).first()
+        return self.db._make_card(result) if result else None
+
+    ################# Archetype Functions #################
+
+    async def _make_arch_list(self, results) -> list[Archetype]:
+        arch_ids = [result.id for result in results if result.id != 0]
+        members_query = self.db._archetype_members_query(arch_ids)
+        members = self.db._collect_archetype_members(
+            await self._all(members_query), arch_ids
+        )
+        return self.db._build_arch_list(results, members)
+
+    async def archetypes(self) -> list[Archetype]:
+        return await self._make_arch_list(await self._all(self.db.arch_query))
+
+    async def get_card_archetypes(self, card: Card) -> list[Archetype]:
+        query = self.db.arch_query.filter(Setcodes.id.in_(card.archetypes))
+        return await self._make_arch_list(await self._all(query))
+
+    async def get_archetypes_by_value(self, key: str, value: str) -> list[Archetype]:
+        return await self.get_archetypes_by_values({key: value})
+
+    async def get_archetypes_by_values(self, params: dict) -> list[Archetype]:
+        query = self.db._query_by_values("arch_query", archetype_filter_params, params)
+        return await self._make_arch_list(await self._all(query))
+
+    async def _make_archetype(self, query) -> Archetype | None:
+        result = await self._one_or_none(query)
+        if result is None:
+            return None
+        return (await self._make_arch_list([result]))[0]
+
+    async def get_archetype_by_id(self, arch_id: int) -> Archetype | None:
+        query = self.db.arch_query.filter(Setcodes.id == int(arch_id))
+        return await self._make_archetype(query)
+
+    async def get_archetype_by_name(self, arch_name: str) -> Archetype | None:
+        query = self.db.arch_query.filter(
+            func.lower(Setcodes.name) == arch_name.lower()
+        )
+        return await self._make_archetype(query)
+
+    ################# Set Functions #################
+
+    async def sets(self) -> list[Set]:
+        if not self.db.has_packs:
+            return []
+        return self.db._make_set_list(await self._all(self.db.set_query))
+
+    async def get_card_sets(self, cardorid: Card | int) -> list[Set]:
+        id = cardorid.id if isinstance(cardorid, Card) else cardorid
+        return (await self.get_sets_for_cards([id]))[id]
+
+    async def get_sets_for_cards(self, card_ids) -> dict[int, list[Set]]:
+        card_ids = [int(card_id) for card_id in card_ids]
+        if not self.db.has_packs:
+            return {card_id: [] for card_id in card_ids}
+
+        for chunk in self.db._missing_card_packs(card_ids):
+            results = await self._all(self.db._card_packs_query(chunk))
+            self.db._cache_card_packs(chunk, results)
+
+        if self.db._set_cache is None:
+            self.db._set_cache = {set.id: set for set in await self.sets()}
+        return self.db._collect_card_sets(card_ids)
+
+    async def get_sets_by_value(self, key: str, value: str) -> list[Set]:
+        return await self.get_sets_by_values({key: value})
+
+    async def get_sets_by_values(self, params: dict) -> list[Set]:
+        query = self.db._query_by_values("set_query", set_filter_params, params)
+        return self.db._make_set_list(await self._all(query))
+
+    async def get_set_by_id(self, set_id: int) -> Set | None:
+        query = self.db.set_query.filter(Packs.id == int(set_id))
+        result = await self._one_or_none(query)
+        return self.db._make_set(result) if result else None
+
+    async def get_set_by_name(self, set_name: str) -> Set | None:
+        query = self.db.set_query.filter(func.lower(Packs.name) == set_name.lower())
+        result = await self._one_or_none(query)
+        return self.db._make_set(result) if result else None
+
+
+class AsyncOmegaDB(AsyncYugiDB):
+    def __init__(
+        self,
+        update: Literal["skip", "force", "auto", "ask"] = "ask",
+        columnar: bool = False,
+        mode: OpenMode = "readwrite",
+        card_cache_size: int = CARD_CACHE_SIZE,
+        pool_size: int = ASYNC_POOL_SIZE,
+        base_url: str = OMEGA_BASE_URL,
+    ):
+        # Downloading and opening the Omega DB happens synchronously
+        db = OmegaDB(update, columnar, mode, card_cache_size, base_url)
+        self._setup(db, db.connection_string, pool_size)
@@ -1,19 +1,48 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, fields
 from datetime import datetime
-from functools import reduce
+from functools import lru_cache, reduce
 from math import isnan
-from operator import or_
+from operator import attrgetter, or_
 from time import strftime
-from typing import Optional
-
-from fake_useragent import UserAgent
+from typing import Callable, Iterable, Optional, get_args, get_origin
 
 from .enums import *
+from .records import RecordSchema, to_records
+from .scripts import get_script_cache
+
+
+@lru_cache(maxsize=None)
+def _user_agent():
+    from fake_useragent import UserAgent
+
+    return UserAgent()
+
+
+def __getattr__(name: str):
+    # The user agent used to be created on import, it is now built on first use
+    if name == "ua":
+        return _user_agent()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
-ua = UserAgent()
 
+@lru_cache(maxsize=65536)
+def _decode_flags(value: int, enum_class) -> tuple:
+    # Members set in a flag value, in enum order. Card pools only use a few
+    # hundred distinct values per enum, so decoding is mostly a cache hit.
+    return tuple(member for member in enum_class if value & int(member))
 
-@dataclass
+
+@lru_cache(maxsize=4096)
+def _format_date(timestamp) -> str:
+    # Release dates repeat across many cards, invalid ones read as datetime.max
+    try:
+        date = datetime.fromtimestamp(timestamp)
+    except:
+        date = datetime.max
+    return date.strftime("%d/%m/%Y")
+
+
+@dataclass(slots=True)
 class Card:
     id: int
     name: str
@@ -54,33 +83,8 @@ class Card:
     def __repr__(self) -> str:
         return self.name
 
-    def to_dict(self):
-        def convert_enum(value):
-            return (
-                value.name
-                if isinstance(value, IntFlag)
-                else (
-                    [v.name if isinstance(v, IntFlag) else v for v in value]
-                    if isinstance(value, list)
-                    else value
-                )
-            )
-
-        fields = {
-            field: convert_enum(getattr(self, field))
-            for field in self.__dataclass_fields__
-            if not field.startswith("_")
-        }
-
-        properties = {
-            prop.strip("_"): convert_enum(getattr(self, prop))
-            for prop in self.__class__.__dict__
-            if isinstance(getattr(self.__class__, prop), property)
-            and prop not in ["tcgdate", "ocgdate", "script"]
-            and not any([prop.startswith(x) for x in ["has_", "is_"]])
-        }
-
-        return fields | properties
+    def to_dict(self) -> dict:
+        return {key: get(self) for key, get in CARD_SCHEMA}
 
     @property
     def text(self) -> str:
@@ -305,17 +309,17 @@ class Card:
     @tcgrarity.setter
     def tcgrarity(self, new: Rarity | list[Rarity]) -> None:
         if isinstance(new, Rarity):
-            self._rarity = new
+            self._raritydata = new
         elif isinstance(new, list):
-            self._rarity = reduce(or_, new)
+            self._raritydata = reduce(or_, new)
         else:
             raise ValueError("Invalid rarity assignment")
 
     def append_rarity(self, rarity: Rarity) -> None:
-        self._rarity |= rarity
+        self._raritydata |= rarity
 
     def remove_rarity(self, rarity: Rarity) -> None:
-        self._rarity &= ~rarity
+        self._raritydata &= ~rarity
 
     @property
     def koid(self):
@@ -343,10 +347,7 @@ class Card:
 
     @property
     def ocgdatestr(self) -> str:
-        if self.ocgdate:
-            return self.ocgdate.strftime("%d/%m/%Y")
-        else:
-            return datetime.max.strftime("%d/%m/%y")
+        return _format_date(self._ocgdatedata)
 
     @property
     def tcgdate(self) -> Optional[datetime]:
@@ -364,10 +365,7 @@ class Card:
 
     @property
     def tcgdatestr(self) -> str:
-        if self.tcgdate:
-            return self.tcgdate.strftime("%d/%m/%Y")
-        else:
-            return datetime.max.strftime("%d/%m/%y")
+        return _format_date(self._tcgdatedata)
 
     def _convert_to_timestamp(self, value: int | datetime) -> int:
         if isinstance(value, int):
@@ -382,10 +380,10 @@ class Card:
             self._typedata &= ~flag
 
     def _enum_values(self, value: int, enum_class) -> list:
-        return [enum_member for enum_member in enum_class if value & enum_member]
+        return list(_decode_flags(value, enum_class))
 
     def has_type(self, type: Type) -> bool:
-        return bool(self._typedata & type)
+        return bool(self._typedata & int(type))
 
     def has_any_type(self, types: list[Type]) -> bool:
         return any(self.has_type(type) for type in types)
@@ -394,7 +392,7 @@ class Card:
         return all(self.has_type(type) for type in types)
 
     def has_category(self, category: Category) -> bool:
-        return bool(self._categorydata & category)
+        return bool(self._categorydata & int(category))
 
     def has_any_category(self, categories: list[Category]) -> bool:
         return any(self.has_category(category) for category in categories)
@@ -403,7 +401,7 @@ class Card:
         return all(self.has_category(category) for category in categories)
 
     def has_genre(self, genre: Genre) -> bool:
-        return bool(self._genredata & genre)
+        return bool(self._genredata & int(genre))
 
     def has_any_genre(self, genres: list[Genre]) -> bool:
         return any(self.has_genre(genre) for genre in genres)
@@ -414,7 +412,7 @@ class Card:
     def has_rarity(self, rarity: Rarity) -> bool:
         if not self._raritydata:
             return False
-        return bool(self._raritydata & rarity)
+        return bool(self._raritydata & int(rarity))
 
     def has_any_rarity(self, rarities: list[Rarity]) -> bool:
         return any(self.has_rarity(rarity) for rarity in rarities)
@@ -424,7 +422,7 @@ class Card:
 
     def has_linkmarker(self, linkmarker: LinkMarker) -> bool:
         if self.has_type(Type.Link):
-            return bool(self._defdata & linkmarker)
+            return bool(self._defdata & int(linkmarker))
         return False
 
     def has_any_linkmarkers(self, linkmarkers: list[LinkMarker]) -> bool:
@@ -537,7 +535,7 @@ class Card:
 
     @property
     def is_token(self) -> bool:
-        return bool(self._typedata & Type.Token)
+        return bool(self._typedata & int(Type.Token))
 
     @property
     def is_spelltrap(self) -> bool:
@@ -617,13 +615,118 @@ class Card:
 
     @property
     def script(self) -> object:
-        import requests
-
         if self._scriptdata != 1:
             return self._scriptdata
 
-        base_url = "https://raw.githubusercontent.com/Fluorohydride/ygopro-scripts/master/c%s.lua"
-        r = requests.get(base_url % self.id)
-        if not r.ok:
-            r = requests.get(base_url % self.alias)
-        return r.text if r.ok else None
+        # Scripts kept in the script repository, see set_script_cache
+        return get_script_cache().get(self.id, self.alias)
+
+
+def _schema_getter(prop: property) -> Callable:
+    # Enum members are serialized by name, looked up in a plain dict rather
+    # than through the name descriptor
+    annotation = prop.fget.__annotations__.get("return")
+    if get_origin(annotation) is list:
+        enum_class = get_args(annotation)[0]
+        if issubclass(enum_class, IntFlag):
+            names = {member: member.name for member in enum_class}
+            return lambda card: [
+                names[member] if member in names else member.name
+                for member in prop.fget(card)
+            ]
+    elif isinstance(annotation, type) and issubclass(annotation, IntFlag):
+        names = {member: member.name for member in annotation}
+        return lambda card: (
+            names[value] if (value := prop.fget(card)) in names else value.name
+        )
+    return prop.fget
+
+
+def _card_schema() -> RecordSchema:
+    # Public dataclass fields, then the value properties in definition order
+    schema = [
+        (field.name, attrgetter(field.name))
+        for field in fields(Card)
+        if not field.name.startswith("_")
+    ]
+    for name, prop in Card.__dict__.items():
+        if (
+            isinstance(prop, property)
+            and name not in ["tcgdate", "ocgdate", "script"]
+            and not name.startswith(("has_", "is_"))
+        ):
+            schema.append((name.strip("_"), _schema_getter(prop)))
+    return schema
+
+
+CARD_SCHEMA = _card_schema()
+
+
+def cards_to_records(
+    cards: Iterable[Card], fields: Iterable[str] | None = None, as_json: bool = False
+) -> list[dict] | bytes:
+    return to_records(cards, CARD_SCHEMA, fields, as_json)
+
+
+class _Deferred:
+    """Card field that is loaded from the database on first access."""
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __get__(self, card, owner=None):
+        if card is None:
+            return self
+        if self.name not in card.__dict__:
+            card._load_deferred()
+        return card.__dict__[self.name]
+
+    def __set__(self, card, value):
+        card.__dict__[self.name] = value
+
+
+class PartialCard(Card):
+    """Card built from a lean projection of card_query.
+
+    Fields that were not selected are fetched through the loader, usually
+    YugiDB.get_card_by_id, the first time any of them is accessed.
+    """
+
+    @classmethod
+    def from_fields(cls, values: dict, loader: Callable[[int], Card | None]):
+        card = cls.__new__(cls)
+        for name, value in values.items():
+            # id is a slot of Card, deferred fields live in the instance dict
+            if name == "id":
+                card.id = value
+            else:
+                card.__dict__[name] = value
+        card._loader = loader
+        return card
+
+    __hash__ = Card.__hash__
+
+    def __eq__(self, other):
+        if not isinstance(other, Card):
+            return NotImplemented
+        return all(
+            getattr(self, field.name) == getattr(other, field.name)
+            for field in fields(Card)
+        )
+
+    def __getstate__(self):
+        # The loader is bound to the database session, pickle the loaded card
+        if any(field.name not in self.__dict__ for field in fields(Card)):
+            self._load_deferred()
+        state = {k: v for k, v in self.__dict__.items() if k != "_loader"}
+        return state, {"id": self.id}
+
+    def _load_deferred(self):
+        card = self._loader(self.id) or Card(self.id, self.__dict__.get("name", ""))
+        for field in fields(Card):
+            self.__dict__.setdefault(field.name, getattr(card, field.name))
+
+
+for _field in fields(Card):
+    if _field.name != "id":
+        setattr(PartialCard, _field.name, _Deferred(_field.name))
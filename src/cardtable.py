@@ -0,0 +1,285 @@
+from dataclasses import fields
+from typing import Iterable, Iterator
+
+import numpy as np
+
+from .card import Card
+from .enums import *
+
+# Card fields in constructor order, and those stored as Python objects
+# rather than int64 columns
+CARD_TABLE_FIELDS = [field.name for field in fields(Card)]
+CARD_TABLE_OBJECT_FIELDS = ["name", "_textdata", "_scriptdata", "_setdata"]
+
+
+class CardTable:
+    """Card pool stored as one array per Card field.
+
+    Integer fields are kept in int64 arrays, with a mask for columns that
+    hold NULLs, and strings in object arrays. Cards are only built when they
+    are accessed, so holding the whole pool costs a few bytes per field
+    instead of a Python object per card and value.
+
+    The has_* and is_* predicates mirror those of Card but return a boolean
+    mask over the whole table. Masks combine with &, | and ~, and select or
+    cards_where turn them back into a table or Cards.
+    """
+
+    def __init__(self, columns: dict[str, np.ndarray], nulls: dict[str, np.ndarray]):
+        self.columns = columns
+        self.nulls = nulls
+        self._order = None
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[tuple]) -> "CardTable":
+        # Rows hold the Card fields in order, like card_query results
+        values = list(zip(*rows)) or [()] * len(CARD_TABLE_FIELDS)
+        columns = {}
+        nulls = {}
+        for field, column in zip(CARD_TABLE_FIELDS, values):
+            if field in CARD_TABLE_OBJECT_FIELDS:
+                columns[field] = np.empty(len(column), dtype=object)
+                columns[field][:] = column
+            elif None in column:
+                nulls[field] = np.array([value is None for value in column])
+                columns[field] = np.array(
+                    [0 if value is None else value for value in column],
+                    dtype=np.int64,
+                )
+            else:
+                columns[field] = np.array(column, dtype=np.int64)
+        return cls(columns, nulls)
+
+    @classmethod
+    def from_cards(cls, cards: Iterable[Card]) -> "CardTable":
+        return cls.from_rows(
+            tuple(getattr(card, field) for field in CARD_TABLE_FIELDS) for card in cards
+        )
+
+    def __len__(self) -> int:
+        return len(self.columns["id"])
+
+    def __getitem__(self, index: int) -> Card:
+        if not -len(self) <= index < len(self):
+            raise IndexError("CardTable index out of range")
+        return self.cards([index])[0]
+
+    def __iter__(self) -> Iterator[Card]:
+        for start in range(0, len(self), 1000):
+            yield from self.cards(range(start, min(start + 1000, len(self))))
+
+    @property
+    def ids(self) -> np.ndarray:
+        return self.columns["id"]
+
+    def _values(self, indices) -> Iterator[tuple]:
+        # Field values of the selected rows as Python objects, row by row
+        indices = np.asarray(indices, dtype=np.intp)
+        columns = []
+        for field in CARD_TABLE_FIELDS:
+            values = self.columns[field][indices].tolist()
+            if field in self.nulls:
+                nulls = self.nulls[field][indices].tolist()
+                values = [None if null else v for v, null in zip(values, nulls)]
+            columns.append(values)
+        return zip(*columns)
+
+    def cards(self, indices) -> list[Card]:
+        return [Card(*values) for values in self._values(indices)]
+
+    def take(self, indices) -> "CardTable":
+        indices = np.asarray(indices, dtype=np.intp)
+        return CardTable(
+            {field: column[indices] for field, column in self.columns.items()},
+            {field: nulls[indices] for field, nulls in self.nulls.items()},
+        )
+
+    def index_of(self, card_ids) -> np.ndarray:
+        # Row index per card id, -1 for ids that are not in the table
+        if self._order is None:
+            self._order = np.argsort(self.ids, kind="stable")
+
+        card_ids = np.asarray(card_ids, dtype=np.int64)
+        if not len(self):
+            return np.full(len(card_ids), -1, dtype=np.intp)
+
+        positions = np.searchsorted(self.ids, card_ids, sorter=self._order)
+        indices = self._order[np.minimum(positions, len(self) - 1)]
+        return np.where(self.ids[indices] == card_ids, indices, -1)
+
+    def get_card_by_id(self, card_id: int) -> Card | None:
+        index = self.index_of([int(card_id)])[0]
+        return self[index] if index >= 0 else None
+
+    def get_cards_by_ids(self, card_ids) -> list[Card]:
+        card_ids = np.unique(np.asarray(list(card_ids), dtype=np.int64))
+        indices = self.index_of(card_ids)
+        return self.cards(indices[indices >= 0])
+
+    def select(self, mask) -> "CardTable":
+        # Rows where a boolean mask is set, or the rows at the given indices
+        mask = np.asarray(mask)
+        return self.take(np.flatnonzero(mask) if mask.dtype == bool else mask)
+
+    def cards_where(self, mask) -> list[Card]:
+        return self.cards(np.flatnonzero(mask))
+
+    def _has_flag(self, field: str, flag: int) -> np.ndarray:
+        # NULLs are stored as 0, so they never have a flag
+        return (self.columns[field] & int(flag)) != 0
+
+    def _has_any_flag(self, field: str, flags: list[int]) -> np.ndarray:
+        mask = np.zeros(len(self), dtype=bool)
+        for flag in flags:
+            mask |= self._has_flag(field, flag)
+        return mask
+
+    def _has_all_flags(self, field: str, flags: list[int]) -> np.ndarray:
+        mask = np.ones(len(self), dtype=bool)
+        for flag in flags:
+            mask &= self._has_flag(field, flag)
+        return mask
+
+    @property
+    def level(self) -> np.ndarray:
+        level = self.columns["_leveldata"] & 0x0000FFFF
+        return np.where(level > 13, -2, level)
+
+    @property
+    def scale(self) -> np.ndarray:
+        return self.columns["_leveldata"] >> 24
+
+    @property
+    def atk(self) -> np.ndarray:
+        return self.columns["_atkdata"]
+
+    @property
+    def def_(self) -> np.ndarray:
+        return np.where(self.is_link, 0, self.columns["_defdata"])
+
+    @property
+    def linkmarkers(self) -> np.ndarray:
+        # LinkMarker flags per card, 0 for cards that are not Link monsters
+        return np.where(self.is_link, self.columns["_defdata"], 0)
+
+    @property
+    def is_link(self) -> np.ndarray:
+        return self.has_type(Type.Link)
+
+    def has_type(self, type: Type) -> np.ndarray:
+        return self._has_flag("_typedata", type)
+
+    def has_any_type(self, types: list[Type]) -> np.ndarray:
+        return self._has_any_flag("_typedata", types)
+
+    def has_all_types(self, types: list[Type]) -> np.ndarray:
+        return self._has_all_flags("_typedata", types)
+
+    def has_category(self, category: Category) -> np.ndarray:
+        return self._has_flag("_categorydata", category)
+
+    def has_any_category(self, categories: list[Category]) -> np.ndarray:
+        return self._has_any_flag("_categorydata", categories)
+
+    def has_all_categories(self, categories: list[Category]) -> np.ndarray:
+        return self._has_all_flags("_categorydata", categories)
+
+    def has_genre(self, genre: Genre) -> np.ndarray:
+        return self._has_flag("_genredata", genre)
+
+    def has_any_genre(self, genres: list[Genre]) -> np.ndarray:
+        return self._has_any_flag("_genredata", genres)
+
+    def has_all_genres(self, genres: list[Genre]) -> np.ndarray:
+        return self._has_all_flags("_genredata", genres)
+
+    def has_rarity(self, rarity: Rarity) -> np.ndarray:
+        return self._has_flag("_raritydata", rarity)
+
+    def has_any_rarity(self, rarities: list[Rarity]) -> np.ndarray:
+        return self._has_any_flag("_raritydata", rarities)
+
+    def has_all_rarities(self, rarities: list[Rarity]) -> np.ndarray:
+        return self._has_all_flags("_raritydata", rarities)
+
+    def has_linkmarker(self, linkmarker: LinkMarker) -> np.ndarray:
+        return self.is_link & self._has_flag("_defdata", linkmarker)
+
+    def has_any_linkmarkers(self, linkmarkers: list[LinkMarker]) -> np.ndarray:
+        return self.is_link & self._has_any_flag("_defdata", linkmarkers)
+
+    def has_all_linkmarkers(self, linkmarkers: list[LinkMarker]) -> np.ndarray:
+        return self.is_link & self._has_all_flags("_defdata", linkmarkers)
+
+    @property
+    def is_monster(self) -> np.ndarray:
+        return self.has_type(Type.Monster)
+
+    @property
+    def has_ability(self) -> np.ndarray:
+        return self.has_any_type([Type.Toon, Type.Spirit, Type.Union, Type.Gemini])
+
+    @property
+    def is_extradeck(self) -> np.ndarray:
+        return self.has_any_type([Type.Fusion, Type.Synchro, Type.Xyz, Type.Link])
+
+    @property
+    def has_property(self) -> np.ndarray:
+        return self.has_any_type(
+            [
+                Type.Ritual,
+                Type.QuickPlay,
+                Type.Continuous,
+                Type.Equip,
+                Type.Field,
+                Type.Counter,
+            ]
+        )
+
+    @property
+    def has_atk_equ_def(self) -> np.ndarray:
+        return self.is_monster & (self.atk == self.def_)
+
+    @property
+    def is_token(self) -> np.ndarray:
+        return self.has_type(Type.Token)
+
+    @property
+    def is_spelltrap(self) -> np.ndarray:
+        return self.has_any_type([Type.Spell, Type.Trap])
+
+    @property
+    def is_trap_monster(self) -> np.ndarray:
+        return self.has_type(Type.Trap) & (self.level != 0)
+
+    @property
+    def is_dark_synchro(self) -> np.ndarray:
+        return self.has_category(Category.DarkCard) & self.has_type(Type.Synchro)
+
+    @property
+    def is_legendary_dragon(self) -> np.ndarray:
+        return np.isin(self.ids, [10000050, 10000060, 10000070])
+
+    @property
+    def is_rush(self) -> np.ndarray:
+        return self.has_any_category(
+            [Category.RushCard, Category.RushMax, Category.RushLegendary]
+        )
+
+    @property
+    def is_beta(self) -> np.ndarray:
+        return self.has_category(Category.BetaCard)
+
+    @property
+    def is_skill(self) -> np.ndarray:
+        return self.has_category(Category.SkillCard)
+
+    @property
+    def is_god(self) -> np.ndarray:
+        return self.has_any_category(
+            [Category.RedGod, Category.BlueGod, Category.YellowGod]
+        )
+
+    @property
+    def is_pre_errata(self) -> np.ndarray:
+        return self.has_category(Category.PreErrata)
@@ -0,0 +1,225 @@
+import operator
+from enum import IntFlag
+from typing import Iterator
+
+import numpy as np
+
+from .card import Card
+from .cardtable import CardTable
+from .constants import card_order_params, columnar_filter_params, columnar_order_params
+from .enums import *
+from .util import (
+    enum_members,
+    like_regex,
+    normalize_filter_value,
+    parse_filter_value,
+    parse_order_by,
+)
+
+COLUMNAR_OPS = {
+    "==": operator.eq,
+    "!=": operator.ne,
+    ">=": operator.ge,
+    "<=": operator.le,
+    ">": operator.gt,
+    "<": operator.lt,
+}
+
+
+def text_column(values) -> np.ndarray:
+    # Missing texts compare as empty strings
+    column = np.empty(len(values), dtype=object)
+    column[:] = [value or "" for value in values]
+    return column
+
+
+def like_mask(data: np.ndarray, pattern: str) -> np.ndarray:
+    # Rows of a text column matching an SQL LIKE pattern
+    match = like_regex(pattern).fullmatch
+    return np.fromiter((match(value) is not None for value in data), bool, len(data))
+
+
+class ColumnarEngine:
+    """In-memory, NumPy backed copy of the card pool.
+
+    Answers card filter queries by evaluating the same query DSL as
+    YugiDB._build_query as vectorized operations over whole columns.
+    """
+
+    def __init__(self, rows):
+        self.table = CardTable.from_rows(rows)
+        columns = self.table.columns
+
+        # Integer columns are the arrays of the table itself
+        self.id = columns["id"]
+        self.type = columns["_typedata"]
+        self.race = columns["_racedata"]
+        self.attribute = columns["_attributedata"]
+        self.category = columns["_categorydata"]
+        self.genre = columns["_genredata"]
+        self.level = columns["_leveldata"]
+        self.atk = columns["_atkdata"]
+        self.def_ = columns["_defdata"]
+        self.setcode = columns["_archcode"]
+        self.support = columns["_supportcode"]
+        self.ot = columns["status"]
+        self.tcgdate = columns["_tcgdatedata"]
+        self.ocgdate = columns["_ocgdatedata"]
+
+        # Texts stay object arrays sharing the strings of the table
+        self.name = text_column(columns["name"])
+        self.desc = text_column(columns["_textdata"])
+
+        # Koids are outer joined, missing values behave like SQL NULLs.
+        self.koid = np.ma.masked_array(
+            columns["_koiddata"],
+            mask=self.table.nulls.get("_koiddata", np.zeros(len(self.table), bool)),
+        )
+
+    def __len__(self) -> int:
+        return len(self.table)
+
+    @property
+    def is_monster(self) -> np.ndarray:
+        return self.has_type(Type.Monster)
+
+    def has_type(self, type: Type) -> np.ndarray:
+        return (self.type & int(type)) != 0
+
+    def has_category(self, category: Category) -> np.ndarray:
+        return (self.category & int(category)) != 0
+
+    def _build_mask(
+        self,
+        params: dict[str, int | str | list[IntFlag] | IntFlag],
+        key: str,
+        column,
+        valuetype: type = str,
+        condition=None,
+        special={},
+    ):
+        values = params.get(key)
+
+        if not values:
+            return None
+
+        conv_values = normalize_filter_value(values)
+        data = column(self)
+
+        def _build_submask(term: tuple[bool, str, str]):
+            negated, op, value = term
+
+            if value in special:
+                # Handle special query values
+                submask = special[value](self)
+            elif valuetype == "substr":
+                # Handle substring queries
+                submask = like_mask(data, f"%{value}%")
+            elif valuetype == str:
+                # Handle exact string queries
+                submask = data == str(value)
+            elif valuetype == int:
+                # Handle integer queries
+                submask = COLUMNAR_OPS[op](data, int(value))
+            elif issubclass(valuetype, IntFlag):
+                # Handle queries for specific types
+                submask = (data & int(enum_members(valuetype)[value])) != 0
+            else:
+                raise TypeError("Invalid type for value")
+
+            # Check if value is negated
+            if negated:
+                submask = ~submask
+
+            # Comparisons against missing values never match
+            return np.ma.filled(submask, False)
+
+        mask = np.zeros(len(self), dtype=bool)
+        for terms in parse_filter_value(conv_values):
+            and_mask = np.ones(len(self), dtype=bool)
+            for term in terms:
+                and_mask &= _build_submask(term)
+            mask |= and_mask
+
+        if condition is not None:
+            mask &= condition(self)
+
+        return mask
+
+    def get_mask_by_values(self, params: dict) -> np.ndarray:
+        params = {k.lower(): v for k, v in params.items()}
+        mask = np.ones(len(self), dtype=bool)
+
+        for filter_param in columnar_filter_params:
+            filter = self._build_mask(params, **filter_param)
+            if filter is not None:
+                mask &= filter
+
+        return mask
+
+    def _paginate(
+        self,
+        mask: np.ndarray,
+        limit: int | None = None,
+        offset: int | None = None,
+        order_by: str | None = None,
+        after: Card | None = None,
+    ) -> np.ndarray:
+        key, descending = parse_order_by(order_by or "id")
+        if key == "id":
+            data = self.id
+        elif key in columnar_order_params:
+            data = columnar_order_params[key](self)
+        else:
+            raise ValueError(f"Invalid order_by key: {key}")
+
+        if after is not None:
+            # Keyset cursor, continue right after the given card.
+            if key == "id":
+                mask = mask & (self.id < after.id if descending else self.id > after.id)
+            else:
+                value = card_order_params[key]["value"](after)
+                beyond = data < value if descending else data > value
+                mask = mask & (beyond | ((data == value) & (self.id > after.id)))
+
+        indices = np.flatnonzero(mask)
+        if key == "id":
+            order = np.argsort(self.id[indices])
+            if descending:
+                order = order[::-1]
+        elif descending:
+            # Descending keys, ties are still broken by ascending id.
+            ranks = np.unique(data[indices], return_inverse=True)[1]
+            order = np.lexsort((self.id[indices], -ranks))
+        else:
+            order = np.lexsort((self.id[indices], data[indices]))
+
+        start = offset or 0
+        stop = None if limit is None else start + limit
+        return indices[order][start:stop]
+
+    def _make_card(self, i: int) -> Card:
+        return self.table[i]
+
+    def _make_cards(self, indices) -> list[Card]:
+        return self.table.cards(indices)
+
+    def iter_cards_by_values(self, params: dict) -> Iterator[Card]:
+        mask = self.get_mask_by_values(params)
+        for i in np.flatnonzero(mask):
+            yield self._make_card(i)
+
+    def get_cards_by_values(
+        self,
+        params: dict,
+        limit: int | None = None,
+        offset: int | None = None,
+        order_by: str | None = None,
+        after: Card | None = None,
+    ) -> list[Card]:
+        mask = self.get_mask_by_values(params)
+        indices = self._paginate(mask, limit, offset, order_by, after)
+        return self._make_cards(indices)
+
+    def count_cards_by_values(self, params: dict) -> int:
+        return int(np.count_nonzero(self.get_mask_by_values(params)))
@@ -3,6 +3,12 @@ from sqlalchemy import and_, or_
 from .enums import Attribute, Category, Genre, LinkMarker, Race, Type
 from .sqlclasses import *
 
+archetype_roles = {
+    "member": Datas.archetypes,
+    "support": Datas.supportarchs,
+    "related": Datas.relatedarchs,
+}
+
 card_filter_params = [
     {
         "key": "name",
@@ -169,6 +175,21 @@ card_filter_params = [
     },
 ]
 
+# Replace the substring filters of card_filter_params when the FTS5 text
+# index is available.
+fulltext_filter_params = [
+    {
+        "key": "in_name",
+        "column": TextsFts.name,
+        "valuetype": "fulltext",
+    },
+    {
+        "key": "mentions",
+        "column": TextsFts.desc,
+        "valuetype": "fulltext",
+    },
+]
+
 archetype_filter_params = [
     {
         "key": "name",
@@ -207,3 +228,190 @@ set_filter_params = [
         "valuetype": "substr",
     },
 ]
+
+# Mirrors card_filter_params for the in-memory ColumnarEngine. Columns,
+# conditions and special values are callables evaluated against the engine.
+columnar_filter_params = [
+    {
+        "key": "name",
+        "column": lambda e: e.name,
+    },
+    {
+        "key": "id",
+        "column": lambda e: e.id,
+        "valuetype": int,
+    },
+    {
+        "key": "race",
+        "column": lambda e: e.race,
+        "valuetype": Race,
+        "special": {
+            "?": lambda e: (e.race == -2) & e.is_monster,
+        },
+    },
+    {
+        "key": "attribute",
+        "column": lambda e: e.attribute,
+        "valuetype": Attribute,
+        "special": {
+            "?": lambda e: (e.attribute == -2) & e.is_monster,
+        },
+    },
+    {
+        "key": "atk",
+        "column": lambda e: e.atk,
+        "valuetype": int,
+        "special": {
+            "def": lambda e: (e.atk == e.def_) & e.is_monster,
+            "?": lambda e: (e.atk == -2) & e.is_monster,
+        },
+    },
+    {
+        "key": "def",
+        "column": lambda e: e.def_,
+        "valuetype": int,
+        "special": {
+            "atk": lambda e: (e.atk == e.def_) & e.is_monster,
+            "?": lambda e: (e.def_ == -2) & e.is_monster,
+        },
+    },
+    {
+        "key": "level",
+        "column": lambda e: e.level & 0x0000FFFF,
+        "valuetype": int,
+        "special": {
+            "?": lambda e: (e.level == -2) & e.is_monster,
+        },
+    },
+    {
+        "key": "scale",
+        "column": lambda e: e.level >> 24,
+        "valuetype": int,
+        "condition": lambda e: e.has_type(Type.Pendulum),
+    },
+    {
+        "key": "koid",
+        "column": lambda e: e.koid,
+        "valuetype": int,
+    },
+    {
+        "key": "type",
+        "column": lambda e: e.type,
+        "valuetype": Type,
+        "special": {
+            "trapmonster": lambda e: e.has_type(Type.Trap) & (e.level != 0),
+            "darksynchro": lambda e: e.has_category(Category.DarkCard)
+            & e.has_type(Type.Synchro),
+            "maindeck": lambda e: ~e.has_type(
+                Type.Fusion | Type.Synchro | Type.Xyz | Type.Link | Type.Token
+            )
+            & e.is_monster,
+            "extradeck": lambda e: e.has_type(
+                Type.Fusion | Type.Synchro | Type.Xyz | Type.Link
+            ),
+        },
+    },
+    {
+        "key": "category",
+        "column": lambda e: e.category,
+        "valuetype": Category,
+    },
+    {
+        "key": "genre",
+        "column": lambda e: e.genre,
+        "valuetype": Genre,
+    },
+    {
+        "key": "linkmarker",
+        "column": lambda e: e.def_,
+        "valuetype": LinkMarker,
+        "condition": lambda e: e.has_type(Type.Link),
+    },
+    {
+        "key": "in_name",
+        "column": lambda e: e.name,
+        "valuetype": "substr",
+    },
+    {
+        "key": "mentions",
+        "column": lambda e: e.desc,
+        "valuetype": "substr",
+    },
+]
+
+# Sort keys accepted by order_by. "value" reads the same key from a Card so
+# the last card of a page can be used as a keyset cursor.
+card_order_params = {
+    "name": {
+        "column": Texts.name,
+        "value": lambda card: card.name,
+    },
+    "atk": {
+        "column": Datas.atk,
+        "value": lambda card: card._atkdata,
+    },
+    "level": {
+        "column": Datas.level.op("&")(0x0000FFFF),
+        "value": lambda card: card._leveldata & 0x0000FFFF,
+    },
+    "date": {
+        "column": Datas.tcgdate,
+        "value": lambda card: card._tcgdatedata,
+    },
+}
+
+columnar_order_params = {
+    "name": lambda e: e.name,
+    "atk": lambda e: e.atk,
+    "level": lambda e: e.level & 0x0000FFFF,
+    "date": lambda e: e.tcgdate,
+}
+
+# Columns card_query can select, in Card field order. "sets" is built from
+# a group_concat subquery over relations and packs.
+card_fields = {
+    "id": {"field": "id", "column": Datas.id},
+    "name": {"field": "name", "column": Texts.name},
+    "desc": {"field": "_textdata", "column": Texts.desc},
+    "type": {"field": "_typedata", "column": Datas.type},
+    "race": {"field": "_racedata", "column": Datas.race},
+    "attribute": {"field": "_attributedata", "column": Datas.attribute},
+    "category": {"field": "_categorydata", "column": Datas.category},
+    "genre": {"field": "_genredata", "column": Datas.genre},
+    "level": {"field": "_leveldata", "column": Datas.level},
+    "atk": {"field": "_atkdata", "column": Datas.atk},
+    "def": {"field": "_defdata", "column": Datas.def_},
+    "tcgdate": {"field": "_tcgdatedata", "column": Datas.tcgdate},
+    "ocgdate": {"field": "_ocgdatedata", "column": Datas.ocgdate},
+    "ot": {"field": "status", "column": Datas.ot},
+    "setcode": {"field": "_archcode", "column": Datas.setcode},
+    "support": {"field": "_supportcode", "column": Datas.support},
+    "alias": {"field": "alias", "column": Datas.alias},
+    "script": {"field": "_scriptdata", "column": Datas.script},
+    "koid": {"field": "_koiddata", "column": Koids.koid},
+    "rarity": {"field": "_raritydata", "column": Rarities.tcgrarity},
+    "sets": {"field": "_setdata", "column": None},
+}
+
+# Named projections for card queries. Cards built from a lean projection
+# load the remaining fields on first access.
+card_projections = {
+    "full": tuple(card_fields),
+    "names": ("id", "name"),
+    "stats": (
+        "id",
+        "name",
+        "type",
+        "race",
+        "attribute",
+        "category",
+        "genre",
+        "level",
+        "atk",
+        "def",
+        "ot",
+        "setcode",
+        "support",
+        "alias",
+    ),
+}
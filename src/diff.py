@@ -0,0 +1,165 @@
+import sqlite3
+from contextlib import closing
+from dataclasses import dataclass, field
+from pathlib import Path
+
+# Tables whose rows make up a card, keyed on the card id. Missing tables are
+# skipped.
+CARD_TABLES = ["datas", "texts", "koids", "rarities"]
+
+
+@dataclass
+class DatabaseDelta:
+    added: list[int] = field(default_factory=list)
+    removed: list[int] = field(default_factory=list)
+    changed: list[int] = field(default_factory=list)
+    archetypes: list[int] = field(default_factory=list)
+    sets: list[int] = field(default_factory=list)
+
+    @property
+    def cards(self) -> list[int]:
+        return sorted(self.added + self.removed + self.changed)
+
+
+def _tables(connection: sqlite3.Connection, schema: str) -> set[str]:
+    return {
+        name
+        for name, in connection.execute(
+            f"SELECT name FROM {schema}.sqlite_master WHERE type = 'table'"
+        )
+    }
+
+
+def _row_hash(connection: sqlite3.Connection, schema: str, table: str) -> str:
+    # SQL expression over every column of the table, equal rows give equal
+    # values. NULL-safe through quote().
+    columns = [
+        row[1] for row in connection.execute(f"PRAGMA {schema}.table_info({table})")
+    ]
+    return " || '|' || ".join(f'quote({table}."{column}")' for column in columns)
+
+
+def _card_hashes(connection: sqlite3.Connection, schema: str) -> str:
+    tables = [table for table in CARD_TABLES if table in _tables(connection, schema)]
+    hashes = " || '#' || ".join(
+        _row_hash(connection, schema, table) for table in tables
+    )
+    joins = " ".join(
+        f"{'JOIN' if table == 'texts' else 'LEFT JOIN'} {schema}.{table} "
+        f"ON datas.id = {table}.id"
+        for table in tables[1:]
+    )
+    return f"SELECT datas.id AS id, {hashes} AS hash FROM {schema}.datas {joins}"
+
+
+def _keyed_hashes(connection: sqlite3.Connection, schema: str, table: str, key: str):
+    # Rows without a key cannot be matched between versions and are skipped
+    hashes = _row_hash(connection, schema, table)
+    return (
+        f"SELECT {key} AS id, {hashes} AS hash FROM {schema}.{table} "
+        f"WHERE {key} IS NOT NULL"
+    )
+
+
+def _compare(connection: sqlite3.Connection, new: str, old: str):
+    # Ids only in new, only in old, and in both with differing row hashes.
+    query = f"""
+        WITH new AS ({new}), old AS ({old})
+        SELECT new.id, 'added' FROM new LEFT JOIN old ON new.id = old.id
+        WHERE old.id IS NULL
+        UNION ALL
+        SELECT old.id, 'removed' FROM old LEFT JOIN new ON old.id = new.id
+        WHERE new.id IS NULL
+        UNION ALL
+        SELECT new.id, 'changed' FROM new JOIN old ON new.id = old.id
+        WHERE new.hash IS NOT old.hash
+    """
+    result = {"added": set(), "removed": set(), "changed": set()}
+    for id, kind in connection.execute(query):
+        result[kind].add(id)
+    return result
+
+
+def diff_databases(old: str | Path, new: str | Path) -> DatabaseDelta:
+    """Compare two versions of a card database file.
+
+    Cards, archetypes and sets are compared by hashing their rows in SQL
+    with the old database attached to the new one. Cards also count as
+    changed when they are added to or removed from a set, archetypes when a
+    card joins or leaves them, sets when their card list changes.
+    """
+    new_uri = f"{Path(new).absolute().as_uri()}?mode=ro"
+    old_uri = f"{Path(old).absolute().as_uri()}?mode=ro"
+
+    with closing(sqlite3.connect(new_uri, uri=True)) as connection:
+        connection.execute("ATTACH DATABASE ? AS old", (old_uri,))
+        delta = DatabaseDelta()
+
+        cards = _compare(
+            connection,
+            _card_hashes(connection, "main"),
+            _card_hashes(connection, "old"),
+        )
+        delta.added = sorted(cards["added"])
+        delta.removed = sorted(cards["removed"])
+        delta.changed = sorted(cards["changed"])
+
+        # Archetypes with changed setcodes rows or members
+        archetypes = set()
+        both = _tables(connection, "main") & _tables(connection, "old")
+        if "setcodes" in both:
+            # Same archetype id as Setcodes.id, custom databases may only
+            # have a betacode
+            key = "COALESCE(officialcode, betacode)"
+            setcodes = _compare(
+                connection,
+                _keyed_hashes(connection, "main", "setcodes", key),
+                _keyed_hashes(connection, "old", "setcodes", key),
+            )
+            archetypes |= set().union(*setcodes.values())
+
+        card_ids = delta.cards
+        for schema in ["main", "old"]:
+            for start in range(0, len(card_ids), 500):
+                chunk = card_ids[start : start + 500]
+                rows = connection.execute(
+                    f"SELECT setcode, support FROM {schema}.datas "
+                    f"WHERE id IN ({', '.join('?' * len(chunk))})",
+                    chunk,
+                )
+                for setcode, support in rows:
+                    # Columns are nullable in custom databases
+                    for code in [setcode or 0, support or 0]:
+                        archetypes |= {(code >> x) & 0xFFFF for x in [0, 16, 32, 48]}
+        archetypes.discard(0)
+        delta.archetypes = sorted(archetypes)
+
+        # Sets with changed packs rows or contents
+        if {"packs", "relations"} <= both:
+            packs = _compare(
+                connection,
+                _keyed_hashes(connection, "main", "packs", "id"),
+                _keyed_hashes(connection, "old", "packs", "id"),
+            )
+            contents = connection.execute("""
+                SELECT cardid, packid FROM main.relations
+                EXCEPT SELECT cardid, packid FROM old.relations
+                UNION
+                SELECT cardid, packid FROM (
+                    SELECT cardid, packid FROM old.relations
+                    EXCEPT SELECT cardid, packid FROM main.relations
+                )
+                """).fetchall()
+            sets = set().union(*packs.values())
+            sets |= {packid for _, packid in contents}
+            delta.sets = sorted(sets)
+
+            # Reprints only touch relations, but change the sets of cards that
+            # are in both versions
+            kept = connection.execute(
+                "SELECT id FROM main.datas INTERSECT SELECT id FROM old.datas"
+            )
+            reprinted = {cardid for cardid, _ in contents} & {id for id, in kept}
+            delta.changed = sorted(cards["changed"] | reprinted)
+
+    return delta
@@ -0,0 +1,185 @@
+import csv
+import io
+import json
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from itertools import islice
+from typing import Iterable, Iterator, Literal
+
+from .card import CARD_SCHEMA, Card, cards_to_records
+from .importer import LIST_FIELDS
+
+ExportFormat = Literal["jsonl", "json", "csv", "parquet"]
+
+EXPORT_CHUNK_SIZE = 2000
+
+# to_dict keys in output order
+EXPORT_FIELDS = [key for key, _ in CARD_SCHEMA]
+
+# Kind of value each field holds, used for the Parquet schema
+EXPORT_FIELD_TYPES = {
+    "id": "int",
+    "name": "str",
+    "status": "int",
+    "alias": "int",
+    "text": "str",
+    "level_str": "str",
+    "type_str": "str",
+    "type": "list[str]",
+    "category": "list[str]",
+    "genre": "list[str]",
+    "level": "int",
+    "scale": "int",
+    "atk": "int",
+    "def": "int",
+    "linkmarkers": "list[str]",
+    "race": "str",
+    "attribute": "str",
+    "tcgrarity": "list[str]",
+    "koid": "int",
+    "ocgdatestr": "str",
+    "tcgdatestr": "str",
+    "archetypes": "list[int]",
+    "support": "list[int]",
+    "related": "list[int]",
+    "sets": "list[int]",
+}
+
+
+def guess_export_format(path: str) -> ExportFormat:
+    extension = path.rsplit(".", 1)[-1].lower()
+    if extension in ["jsonl", "json", "csv", "parquet"]:
+        return extension
+    raise ValueError(f"Unknown card dump format: {path}")
+
+
+def _export_fields(fields: Iterable[str] | None) -> list[str]:
+    if fields is None:
+        return list(EXPORT_FIELDS)
+
+    fields = list(fields)
+    for field in fields:
+        if field not in EXPORT_FIELDS:
+            raise ValueError(f"Invalid field: {field}")
+    return fields
+
+
+def _parquet_schema(fields: list[str]):
+    import pyarrow as pa
+
+    types = {
+        "int": pa.int64(),
+        "str": pa.string(),
+        "list[str]": pa.list_(pa.string()),
+        "list[int]": pa.list_(pa.int64()),
+    }
+    for field in fields:
+        if field not in EXPORT_FIELD_TYPES:
+            raise ValueError(f"No Parquet type for field: {field}")
+    return pa.schema([(field, types[EXPORT_FIELD_TYPES[field]]) for field in fields])
+
+
+def _serialize(rows: list[tuple], format: ExportFormat, fields: list[str]):
+    # Runs in the worker processes, rows are full card_query rows. Returns
+    # the number of records with the serialized chunk.
+    records = cards_to_records([Card(*row) for row in rows], fields)
+
+    if format == "jsonl":
+        data = "".join(json.dumps(record) + "\n" for record in records)
+    elif format == "json":
+        data = ",\n".join(json.dumps(record) for record in records)
+    elif format == "csv":
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fields)
+        for record in records:
+            for field in LIST_FIELDS:
+                if field in record:
+                    record[field] = ",".join(str(item) for item in record[field])
+            writer.writerow(record)
+        data = buffer.getvalue()
+    else:
+        import pyarrow as pa
+
+        data = pa.RecordBatch.from_pylist(records, _parquet_schema(fields))
+    return len(records), data
+
+
+def _chunks(rows: Iterable[tuple], chunk_size: int) -> Iterator[list[tuple]]:
+    rows = iter(rows)
+    while chunk := list(islice(rows, chunk_size)):
+        yield chunk
+
+
+def _map_bounded(call, chunks: Iterator[list], max_workers: int) -> Iterator:
+    # Like executor.map, but only keeps a couple of chunks per worker in
+    # flight so memory stays bounded on large pools
+    if max_workers == 1:
+        yield from map(call, chunks)
+        return
+
+    with ProcessPoolExecutor(max_workers) as executor:
+        pending = deque()
+        for chunk in chunks:
+            pending.append(executor.submit(call, chunk))
+            if len(pending) >= 2 * max_workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def export_cards(
+    rows: Iterable[tuple],
+    path: str,
+    format: ExportFormat,
+    fields: Iterable[str] | None = None,
+    chunk_size: int = EXPORT_CHUNK_SIZE,
+    max_workers: int | None = None,
+) -> int:
+    """Write card rows to path in chunks, serialized on a process pool.
+
+    Rows are passed to Card as is. The output is written to a temporary
+    file as chunks complete and swapped in at the end, records keep the row
+    order. Returns the number of cards written.
+    """
+    if format not in ["jsonl", "json", "csv", "parquet"]:
+        raise ValueError(f"Invalid format: {format}")
+
+    fields = _export_fields(fields)
+    max_workers = max_workers or os.cpu_count() or 1
+    call = partial(_serialize, format=format, fields=fields)
+    results = _map_bounded(call, _chunks(rows, chunk_size), max_workers)
+
+    count = 0
+    tmp_path = f"{path}.tmp"
+    try:
+        if format == "parquet":
+            import pyarrow.parquet as pq
+
+            with pq.ParquetWriter(tmp_path, _parquet_schema(fields)) as writer:
+                for size, batch in results:
+                    writer.write_batch(batch)
+                    count += size
+        else:
+            with open(tmp_path, "w", encoding="utf-8", newline="") as f:
+                if format == "csv":
+                    csv.writer(f).writerow(fields)
+                elif format == "json":
+                    f.write("[\n")
+
+                for size, data in results:
+                    if format == "json" and count:
+                        f.write(",\n")
+                    f.write(data)
+                    count += size
+
+                if format == "json":
+                    f.write("\n]\n")
+    except BaseException:
+        # Leave no partial output behind
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    os.replace(tmp_path, path)
+    return count
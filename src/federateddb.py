@@ -0,0 +1,222 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from enum import IntFlag
+from operator import attrgetter
+from typing import Any, Callable, Iterable, Literal
+
+from .archetype import Archetype
+from .card import Card
+from .constants import card_order_params
+from .set import Set
+from .util import parse_order_by
+from .yugidb import YugiDB
+
+
+class FederatedDB:
+    """Runs lookups on several databases at once and merges the results.
+
+    Every member database is queried on its own worker thread, so a lookup
+    takes as long as the slowest member. Results are deduplicated by id, on
+    conflicts the first (or last) database in the list wins.
+
+    Member sessions are not thread-safe, so each member is guarded by a lock
+    and only used by one worker at a time, also when the federation itself
+    is called from several threads. Members must not be used directly while
+    federated calls are running on other threads.
+    """
+
+    def __init__(
+        self,
+        databases: Iterable[YugiDB],
+        precedence: Literal["first", "last"] = "first",
+        max_workers: int | None = None,
+    ):
+        if precedence not in ["first", "last"]:
+            raise ValueError(f"Invalid precedence: {precedence}")
+
+        self.databases = list(databases)
+        self.precedence = precedence
+        self.executor = ThreadPoolExecutor(max_workers or len(self.databases) or 1)
+        self._locks = [threading.Lock() for _ in self.databases]
+
+    def close(self):
+        self.executor.shutdown()
+
+    @staticmethod
+    def _locked(call: Callable[[YugiDB], Any], db: YugiDB, lock: threading.Lock):
+        with lock:
+            return call(db)
+
+    def _map(self, call: Callable[[YugiDB], Any]) -> list:
+        # One result per member database, in database order
+        futures = [
+            self.executor.submit(self._locked, call, db, lock)
+            for db, lock in zip(self.databases, self._locks)
+        ]
+        return [future.result() for future in futures]
+
+    def _by_precedence(self, results: list) -> list:
+        return results if self.precedence == "first" else results[::-1]
+
+    def _merge(self, results: list[list]) -> list:
+        winners = {}
+        for items in self._by_precedence(results):
+            for item in items:
+                winners.setdefault(item.id, item)
+
+        merged = []
+        for items in results:
+            for item in items:
+                if winners.get(item.id) is item:
+                    merged.append(winners.pop(item.id))
+        return merged
+
+    @staticmethod
+    def _order(order_by: str | None) -> tuple[Callable[[Card], Any], bool]:
+        key, descending = parse_order_by(order_by or "id")
+        if key == "id":
+            return attrgetter("id"), descending
+        elif key in card_order_params:
+            return card_order_params[key]["value"], descending
+        raise ValueError(f"Invalid order_by key: {key}")
+
+    def _ordered(
+        self,
+        call: Callable[[YugiDB, int | None], list[Card]],
+        limit: int | None,
+        offset: int | None,
+        order_by: str | None,
+    ) -> list[Card]:
+        # Merges the ordered results of every member into one order, ties
+        # broken by ascending id like YugiDB._paginate. Members are asked for
+        # offset + limit cards. When cards were dropped as duplicates, a
+        # member that filled its page may hold more cards that sort before
+        # the cut, then the page size is doubled and the members asked again.
+        value, descending = self._order(order_by)
+
+        def sort(cards: list[Card]) -> list[Card]:
+            cards = sorted(cards, key=attrgetter("id"))
+            return sorted(cards, key=value, reverse=descending)
+
+        def before(a: Card, b: Card) -> bool:
+            if value(a) != value(b):
+                return value(a) > value(b) if descending else value(a) < value(b)
+            return a.id < b.id
+
+        start = offset or 0
+        if limit == 0:
+            return []
+        if limit is None:
+            return sort(self._merge(self._map(lambda db: call(db, None))))[start:]
+
+        stop = start + limit
+        fetch = stop
+        while True:
+            results = self._map(lambda db: call(db, fetch))
+            cards = sort(self._merge(results))
+            full = [result for result in results if len(result) >= fetch]
+            if not any(before(result[-1], cards[stop - 1]) for result in full):
+                return cards[start:stop]
+            fetch *= 2
+
+    def _first(self, results: list):
+        return next(
+            (result for result in self._by_precedence(results) if result is not None),
+            None,
+        )
+
+    ################# Card Functions #################
+
+    @property
+    def cards(self) -> list[Card]:
+        return self._merge(self._map(lambda db: db.cards))
+
+    def get_archetype_cards(self, arch: Archetype) -> list[Card]:
+        return self._merge(self._map(lambda db: db.get_archetype_cards(arch)))
+
+    def get_set_cards(self, set: Set) -> list[Card]:
+        return self._merge(self._map(lambda db: db.get_set_cards(set)))
+
+    def get_cards_by_value(self, key: str, value: str | IntFlag | list[IntFlag]):
+        return self.get_cards_by_values({key: value})
+
+    def get_cards_by_values(
+        self,
+        params: dict,
+        limit: int | None = None,
+        offset: int | None = None,
+        order_by: str | None = None,
+    ) -> list[Card]:
+        return self._ordered(
+            lambda db, fetch: db.get_cards_by_values(
+                params, limit=fetch, order_by=order_by or "id"
+            ),
+            limit,
+            offset,
+            order_by,
+        )
+
+    def search_cards(self, phrase: str, limit: int | None = None) -> list[Card]:
+        cards = self._merge(self._map(lambda db: db.search_cards(phrase, limit)))
+        return cards[:limit]
+
+    def get_card_by_id(self, card_id) -> Card | None:
+        return self._first(self._map(lambda db: db.get_card_by_id(card_id)))
+
+    def get_cards_by_ids(self, card_ids) -> list[Card]:
+        card_ids = list(card_ids)
+        cards = self._merge(self._map(lambda db: db.get_cards_by_ids(card_ids)))
+        return sorted(cards, key=lambda card: card.id)
+
+    def get_card_by_name(self, card_name) -> Card | None:
+        return self._first(self._map(lambda db: db.get_card_by_name(card_name)))
+
+    ################# Archetype Functions #################
+
+    @property
+    def archetypes(self) -> list[Archetype]:
+        return self._merge(self._map(lambda db: db.archetypes))
+
+    def get_card_archetypes(self, card: Card) -> list[Archetype]:
+        return self._merge(self._map(lambda db: db.get_card_archetypes(card)))
+
+    def get_archetypes_by_value(self, key: str, value: str):
+        return self.get_archetypes_by_values({key: value})
+
+    def get_archetypes_by_values(self, params: dict) -> list[Archetype]:
+        return self._merge(self._map(lambda db: db.get_archetypes_by_values(params)))
+
+    def get_archetype_by_id(self, arch_id: int) -> Archetype | None:
+        return self._first(self._map(lambda db: db.get_archetype_by_id(arch_id)))
+
+    def get_archetype_by_name(self, arch_name: str) -> Archetype | None:
+        return self._first(self._map(lambda db: db.get_archetype_by_name(arch_name)))
+
+    ################# Set Functions #################
+
+    @property
+    def sets(self) -> list[Set]:
+        return self._merge(self._map(lambda db: db.sets))
+
+    def get_card_sets(self, cardorid: Card | int) -> list[Set]:
+        return self._merge(self._map(lambda db: db.get_card_sets(cardorid)))
+
+    def get_sets_for_cards(self, card_ids) -> dict[int, list[Set]]:
+        card_ids = [int(card_id) for card_id in card_ids]
+        results = self._map(lambda db: db.get_sets_for_cards(card_ids))
+        return {
+            card_id: self._merge([result[card_id] for result in results])
+            for card_id in card_ids
+        }
+
+    def get_sets_by_value(self, key: str, value: str):
+        return self.get_sets_by_values({key: value})
+
+    def get_sets_by_values(self, params: dict) -> list[Set]:
+        return self._merge(self._map(lambda db: db.get_sets_by_values(params)))
+
+    def get_set_by_id(self, set_id: int) -> Set | None:
+        return self._first(self._map(lambda db: db.get_set_by_id(set_id)))
+
+    def get_set_by_name(self, set_name: str) -> Set | None:
+        return self._first(self._map(lambda db: db.get_set_by_name(set_name)))
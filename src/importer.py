@@ -0,0 +1,211 @@
+import csv
+import json
+from datetime import datetime, timezone
+from functools import lru_cache
+from typing import Iterable, Iterator, Literal
+
+from .enums import *
+from .sqlclasses import Datas
+from .util import enum_members
+
+ImportFormat = Literal["cdb", "json", "jsonl", "csv"]
+
+# to_dict keys holding enum member names, and the enum they belong to
+ENUM_FIELDS = {
+    "type": Type,
+    "category": Category,
+    "genre": Genre,
+    "race": Race,
+    "attribute": Attribute,
+    "linkmarkers": LinkMarker,
+    "tcgrarity": Rarity,
+}
+
+# to_dict keys holding lists, CSV cells join them with commas
+LIST_FIELDS = [
+    "type",
+    "category",
+    "genre",
+    "linkmarkers",
+    "tcgrarity",
+    "archetypes",
+    "support",
+    "related",
+    "sets",
+]
+
+
+def guess_format(path: str) -> ImportFormat:
+    extension = path.rsplit(".", 1)[-1].lower()
+    if extension in ["cdb", "db"]:
+        return "cdb"
+    elif extension in ["json", "jsonl", "csv"]:
+        return extension
+    raise ValueError(f"Unknown card dump format: {path}")
+
+
+def read_records(path: str, format: ImportFormat) -> Iterator[dict]:
+    """Stream to_dict shaped card records from a JSON, JSON Lines or CSV file."""
+    if format == "json":
+        with open(path, encoding="utf-8") as f:
+            yield from json.load(f)
+    elif format == "jsonl":
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+    elif format == "csv":
+        with open(path, encoding="utf-8", newline="") as f:
+            for row in csv.DictReader(f):
+                yield {
+                    key: (
+                        [item for item in value.split(",") if item]
+                        if key in LIST_FIELDS
+                        else value
+                    )
+                    for key, value in row.items()
+                    if value != ""
+                }
+    else:
+        raise ValueError(f"Invalid format: {format}")
+
+
+def _names(value) -> list[str]:
+    if value is None:
+        return []
+    if isinstance(value, str):
+        return [value]
+    return list(value)
+
+
+def _flags(names: list[str], members: dict[str, int]) -> int:
+    value = 0
+    for name in names:
+        value |= members[name]
+    return value
+
+
+def _chunks(values, count: int) -> int:
+    # Packs up to count archetype ids into 16 bit chunks
+    return sum(int(value) << (16 * i) for i, value in enumerate(values[:count]))
+
+
+@lru_cache(maxsize=4096)
+def _parse_date(value: str) -> int:
+    # Midnight UTC, so imports do not depend on the local timezone
+    date = datetime.strptime(value, "%d/%m/%Y").replace(tzinfo=timezone.utc)
+    return int(date.timestamp())
+
+
+def _date(record: dict, key: str) -> int:
+    if key in record:
+        return int(record[key])
+    if f"{key}str" in record:
+        return _parse_date(record[f"{key}str"])
+    return getattr(Datas, key).default.arg
+
+
+def decode_records(
+    records: Iterable[dict],
+) -> tuple[dict[str, list[dict]], dict[int, str], int]:
+    """Decode to_dict shaped records into rows per table, keyed by table name.
+
+    Enum names are validated for the whole batch at once, records with
+    unknown names are left out and reported by card id. Records without a
+    valid card id are left out and counted.
+    """
+    records = list(records)
+
+    # Plain ints by name, including every spelling used in this batch
+    members = {}
+    unknown = {}
+    for key, enum in ENUM_FIELDS.items():
+        casefolded = enum_members(enum)
+        names = {name for record in records for name in _names(record.get(key))}
+        members[key] = {
+            name: int(casefolded[name.casefold()])
+            for name in names
+            if name.casefold() in casefolded
+        }
+        unknown[key] = names - members[key].keys()
+    check = {key: names for key, names in unknown.items() if names}
+
+    tables = {"datas": [], "texts": [], "koids": [], "rarities": [], "relations": []}
+    failed = {}
+    skipped = 0
+    for record in records:
+        try:
+            id = int(record["id"])
+        except (KeyError, TypeError, ValueError):
+            skipped += 1
+            continue
+
+        invalid = [
+            f"Unknown {ENUM_FIELDS[key].__name__}: {name}"
+            for key, names in check.items()
+            for name in _names(record.get(key))
+            if name in names
+        ]
+        if invalid:
+            failed[id] = ", ".join(invalid)
+            continue
+
+        try:
+            type = _flags(_names(record.get("type")), members["type"])
+            level = int(record.get("level", 0)) & 0xFFFF
+            scale = int(record.get("scale", 0))
+
+            if type & Type.Link:
+                def_ = _flags(_names(record.get("linkmarkers")), members["linkmarkers"])
+            else:
+                def_ = int(record.get("def", 0))
+
+            tables["datas"].append(
+                {
+                    "id": id,
+                    "ot": int(record.get("status", 0)),
+                    "alias": int(record.get("alias", 0)),
+                    "setcode": _chunks(_names(record.get("archetypes")), 4),
+                    "type": type,
+                    "atk": int(record.get("atk", 0)),
+                    "def": def_,
+                    "level": scale << 24 | scale << 16 | level,
+                    "race": _flags(_names(record.get("race")), members["race"]),
+                    "attribute": _flags(
+                        _names(record.get("attribute")), members["attribute"]
+                    ),
+                    "category": _flags(
+                        _names(record.get("category")), members["category"]
+                    ),
+                    "genre": _flags(_names(record.get("genre")), members["genre"]),
+                    "support": _chunks(_names(record.get("support")), 2)
+                    | _chunks(_names(record.get("related")), 2) << 32,
+                    "ocgdate": _date(record, "ocgdate"),
+                    "tcgdate": _date(record, "tcgdate"),
+                }
+            )
+        except (TypeError, ValueError) as e:
+            failed[id] = str(e)
+            continue
+
+        tables["texts"].append(
+            {"id": id, "name": record.get("name", ""), "desc": record.get("text", "")}
+        )
+        if record.get("koid") is not None:
+            tables["koids"].append({"id": id, "koid": int(record["koid"])})
+        # Cards without a rarity have no row, as with koids
+        if _names(record.get("tcgrarity")):
+            tables["rarities"].append(
+                {
+                    "id": id,
+                    "tcgrarity": _flags(
+                        _names(record.get("tcgrarity")), members["tcgrarity"]
+                    ),
+                }
+            )
+        tables["relations"].extend(
+            {"cardid": id, "packid": int(packid)}
+            for packid in _names(record.get("sets"))
+        )
+
+    return tables, failed, skipped
@@ -1,61 +1,161 @@
+import json
 import os
 import shutil
+import sqlite3
+from contextlib import closing
+from pathlib import Path
 from typing import Literal
 
 import requests
 
-from .yugidb import YugiDB
+from .diff import DatabaseDelta, diff_databases
+from .snapshot import CardSnapshot
+from .yugidb import CARD_CACHE_SIZE, OpenMode, YugiDB
 
 OMEGA_BASE_URL = "https://duelistsunite.org/omega/"
+DOWNLOAD_CHUNK_SIZE = 1 << 20
+DOWNLOAD_TIMEOUT = 60
+
+
+def _write_atomic(path: str, data: str):
+    with open(f"{path}.tmp", "w") as f:
+        f.write(data)
+    os.replace(f"{path}.tmp", path)
 
 
 class OmegaDB(YugiDB):
-    def __init__(self, update: Literal["skip", "force", "auto", "ask"] = "ask"):
+    def __init__(
+        self,
+        update: Literal["skip", "force", "auto", "ask"] = "ask",
+        columnar: bool = False,
+        mode: OpenMode = "readwrite",
+        card_cache_size: int = CARD_CACHE_SIZE,
+        base_url: str = OMEGA_BASE_URL,
+    ):
         self.dbpath = "db/omega/omega.db"
         self.dbpath_old = "db/omega/omega_old.db"
+        self.hashpath = "db/omega/omega.hash"
+        self.hashpath_old = "db/omega/omega_old.hash"
+        self.metapath = "db/omega/omega.json"
+        self.snapshotpath = "db/omega/omega.snapshot"
+        self.base_url = base_url
         self.update = update
+        # Changes applied by the last update, None before the first one
+        self.delta: DatabaseDelta | None = None
         self.download()
         self.connection_string = f"sqlite:///{self.dbpath}"
-        super().__init__(self.connection_string)
+        super().__init__(self.connection_string, columnar, mode, card_cache_size)
+
+    def _url(self, name: str) -> str:
+        return f"{self.base_url.rstrip('/')}/{name}"
+
+    def _read_meta(self) -> dict:
+        # Validators of the last download and of an interrupted one
+        if not os.path.exists(self.metapath):
+            return {}
+        with open(self.metapath) as f:
+            return json.load(f)
+
+    def _write_meta(self, meta: dict):
+        _write_atomic(self.metapath, json.dumps(meta))
+
+    def _fetch_hash(self) -> str:
+        r = requests.get(self._url("Database.hash"), timeout=DOWNLOAD_TIMEOUT)
+        r.raise_for_status()
+        return r.text
+
+    def _fetch_db(self, path: str, conditional: bool) -> dict | None:
+        # Streams the database into path, resuming an interrupted download
+        # with Range. Returns the validators of the download, or None if the
+        # server reports the current database as unchanged.
+        meta = self._read_meta()
+        headers = {}
+        if conditional and meta.get("etag"):
+            headers["If-None-Match"] = meta["etag"]
+        if conditional and meta.get("last_modified"):
+            headers["If-Modified-Since"] = meta["last_modified"]
 
-    def download(self):
-        def download(url: str, path: str):
-            r = requests.get(url, allow_redirects=True)
+        offset = os.path.getsize(path) if os.path.exists(path) else 0
+        if offset and meta.get("partial"):
+            headers["Range"] = f"bytes={offset}-"
+            headers["If-Range"] = meta["partial"]
+
+        with requests.get(
+            self._url("OmegaDB.cdb"),
+            headers=headers,
+            stream=True,
+            timeout=DOWNLOAD_TIMEOUT,
+        ) as r:
+            if r.status_code == 304:
+                return None
+            if r.status_code == 416 and "Range" in headers:
+                # The partial file is already complete, or longer than the
+                # database now is. Start over without Range.
+                r.close()
+                os.remove(path)
+                return self._fetch_db(path, conditional)
             r.raise_for_status()
-            with open(path, "wb") as f:
-                f.write(r.content)
 
-        db_url = os.path.join(OMEGA_BASE_URL, "OmegaDB.cdb")
-        hash_url = os.path.join(OMEGA_BASE_URL, "Database.hash")
+            validators = {
+                "etag": r.headers.get("ETag"),
+                "last_modified": r.headers.get("Last-Modified"),
+            }
+            meta["partial"] = validators["etag"] or validators["last_modified"]
+            self._write_meta(meta)
+
+            if r.status_code == 206:
+                # Content-Range: bytes start-end/total
+                size = r.headers.get("Content-Range", "").rpartition("/")[2]
+                mode = "ab"
+            else:
+                size = r.headers.get("Content-Length")
+                mode = "wb"
+
+            with open(path, mode) as f:
+                for chunk in r.iter_content(DOWNLOAD_CHUNK_SIZE):
+                    f.write(chunk)
+
+        if size and size.isdigit() and os.path.getsize(path) != int(size):
+            raise requests.ConnectionError("Database download was incomplete")
+
+        return validators
+
+    def _verify_db(self, path: str):
+        try:
+            uri = f"{Path(path).absolute().as_uri()}?mode=ro"
+            with closing(sqlite3.connect(uri, uri=True)) as connection:
+                result = connection.execute("PRAGMA quick_check").fetchone()
+        except sqlite3.DatabaseError:
+            result = None
+
+        if result != ("ok",):
+            os.remove(path)
+            raise ValueError("Downloaded database failed verification")
+
+    def download(self) -> bool:
+        # Checks Database.hash and applies an update if there is one. The
+        # database is streamed to omega.db.part and only replaces omega.db
+        # once it is complete and passes an SQLite integrity check.
         self.dbdir = os.path.dirname(self.dbpath)
-        hashpath = os.path.join(self.dbdir, "omega.hash")
-        hashpath_old = os.path.join(self.dbdir, "omega_old.hash")
+        partpath = f"{self.dbpath}.part"
+        has_db = os.path.exists(self.dbpath)
 
         if not os.path.exists(self.dbdir):
             os.makedirs(self.dbdir)
 
-        if os.path.exists(self.dbpath) and self.update == "skip":
-            return
-
-        if os.path.exists(self.dbpath) and self.update != "force":
-            shutil.copy(self.dbpath, self.dbpath_old)
-            if os.path.exists(hashpath):
-                shutil.copy(hashpath, hashpath_old)
-                with open(hashpath) as f:
-                    old_hash = f.read()
-            else:
-                old_hash = None
+        if has_db and self.update == "skip":
+            return False
 
-            try:
-                download(hash_url, hashpath)
-            except requests.ConnectionError:
+        try:
+            new_hash = self._fetch_hash()
+        except requests.RequestException:
+            if has_db:
                 print("Failed to get current Hash, skipping update.")
                 return False
+            raise
 
-            with open(hashpath) as f:
-                new_hash = f.read()
-
-            if old_hash == new_hash:
+        if has_db and self.update != "force":
+            if self.hash == new_hash:
                 return False
             elif self.update != "auto":
                 print("A new version of the Omega database is available.")
@@ -65,11 +165,66 @@ class OmegaDB(YugiDB):
                 if user_response != "y":
                     print("Skipping database update.")
                     return False
+
         print("Downloading up-to-date db...")
-        download(db_url, self.dbpath)
-        download(hash_url, hashpath)
+        conditional = has_db and self.update != "force"
+        try:
+            validators = self._fetch_db(partpath, conditional)
+            if validators is not None:
+                self._verify_db(partpath)
+        except (requests.RequestException, ValueError):
+            if has_db:
+                print("Failed to download the database, keeping the current one.")
+                return False
+            raise
+
+        if validators is None:
+            # Not modified, the hash is only stored along with a new database
+            return False
+
+        if hasattr(self, "engine"):
+            # Pooled connections would keep reading the replaced file
+            self.close()
+
+        if has_db:
+            shutil.copyfile(self.dbpath, self.dbpath_old)
+            if os.path.exists(self.hashpath):
+                shutil.copyfile(self.hashpath, self.hashpath_old)
+        os.replace(partpath, self.dbpath)
+        _write_atomic(self.hashpath, new_hash)
+        self._write_meta(validators)
+
+        if has_db:
+            self.delta = diff_databases(self.dbpath_old, self.dbpath)
+        if hasattr(self, "session"):
+            self.refresh(self.delta if has_db else None)
         return True
 
+    @property
+    def hash(self) -> str:
+        if not os.path.exists(self.hashpath):
+            return ""
+        with open(self.hashpath) as f:
+            return f.read()
+
+    def export_snapshot(self, path: str | None = None, key: str | None = None):
+        super().export_snapshot(
+            path or self.snapshotpath, self.hash if key is None else key
+        )
+
+    def open_snapshot(self, path: str | None = None) -> CardSnapshot:
+        # Reuses the snapshot as long as it matches the current Database.hash
+        path = path or self.snapshotpath
+        try:
+            return CardSnapshot.open(path, self.hash)
+        except FileNotFoundError:
+            pass
+        except ValueError:
+            # Stale, truncated or not a snapshot at all
+            os.remove(path)
+        self.export_snapshot(path)
+        return CardSnapshot.open(path, self.hash)
+
 
 if __name__ == "__main__":
     db = OmegaDB()
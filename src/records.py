@@ -0,0 +1,36 @@
+import json
+from typing import Callable, Iterable
+
+# to_dict keys in order, each with the function computing its value
+RecordSchema = list[tuple[str, Callable]]
+
+
+def select_fields(schema: RecordSchema, fields: Iterable[str] | None) -> RecordSchema:
+    if fields is None:
+        return schema
+
+    getters = dict(schema)
+    selected = []
+    for field in fields:
+        if field not in getters:
+            raise ValueError(f"Invalid field: {field}")
+        selected.append((field, getters[field]))
+    return selected
+
+
+def to_records(
+    items: Iterable,
+    schema: RecordSchema,
+    fields: Iterable[str] | None = None,
+    as_json: bool = False,
+) -> list[dict] | bytes:
+    """Serialize items to to_dict shaped records in one pass.
+
+    fields picks and orders the keys. With as_json the records are returned
+    as the UTF-8 bytes of a JSON array instead.
+    """
+    schema = select_fields(schema, fields)
+    records = [{key: get(item) for key, get in schema} for item in items]
+    if as_json:
+        return json.dumps(records, separators=(",", ":")).encode()
+    return records
@@ -0,0 +1,199 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable
+
+SCRIPT_BASE_URL = (
+    "https://raw.githubusercontent.com/Fluorohydride/ygopro-scripts/master/"
+)
+SCRIPT_DIR = "db/scripts"
+SCRIPT_TIMEOUT = 30
+SCRIPT_WORKERS = 8
+
+
+class ScriptCache:
+    """Card scripts from a local mirror, a disk cache or the script repository.
+
+    Scripts are looked up as c<id>.lua, then under the card's alias. A
+    local_dir, such as a checkout of the script repository, is read first.
+    Downloads are stored in cache_dir with their SHA-256 and ETag, and
+    scripts the server does not have are remembered as missing. With
+    max_age set, older entries are revalidated with a conditional request.
+    A base_url of None never touches the network.
+    """
+
+    def __init__(
+        self,
+        cache_dir: str = SCRIPT_DIR,
+        base_url: str | None = SCRIPT_BASE_URL,
+        local_dir: str | None = None,
+        max_age: float | None = None,
+    ):
+        self.cache_dir = cache_dir
+        self.base_url = base_url
+        self.local_dir = local_dir
+        self.max_age = max_age
+        self.indexpath = os.path.join(cache_dir, "index.json")
+        self._index = None
+        self._dirty = False
+        self._lock = threading.Lock()
+
+    @property
+    def index(self) -> dict[str, dict]:
+        if self._index is None:
+            try:
+                with open(self.indexpath) as f:
+                    self._index = json.load(f)
+            except (OSError, ValueError):
+                self._index = {}
+        return self._index
+
+    def _save_index(self):
+        if not self._dirty:
+            return
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        with self._lock:
+            data = json.dumps(self.index)
+            self._dirty = False
+        with open(f"{self.indexpath}.tmp", "w") as f:
+            f.write(data)
+        os.replace(f"{self.indexpath}.tmp", self.indexpath)
+
+    @staticmethod
+    def _path(directory: str, number: int) -> str:
+        return os.path.join(directory, f"c{number}.lua")
+
+    def _read_cached(self, number: int, entry: dict | None) -> bytes | None:
+        # Cached script if it still matches the hash it was stored with
+        if entry is None or entry["sha256"] is None:
+            return None
+        try:
+            with open(self._path(self.cache_dir, number), "rb") as f:
+                data = f.read()
+        except OSError:
+            return None
+        return data if hashlib.sha256(data).hexdigest() == entry["sha256"] else None
+
+    def _record(
+        self,
+        number: int,
+        data: bytes | None,
+        etag: str | None = None,
+        write: bool = True,
+    ):
+        if data is not None and write:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            path = self._path(self.cache_dir, number)
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+
+        with self._lock:
+            self.index[str(number)] = {
+                "sha256": (
+                    hashlib.sha256(data).hexdigest() if data is not None else None
+                ),
+                "etag": etag,
+                "checked": time.time(),
+            }
+            self._dirty = True
+
+    def _fetch(self, number: int, entry: dict | None, data: bytes | None, session):
+        import requests
+
+        headers = {}
+        if data is not None and entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+
+        url = f"{self.base_url.rstrip('/')}/c{number}.lua"
+        try:
+            r = (session or requests).get(url, headers=headers, timeout=SCRIPT_TIMEOUT)
+        except requests.RequestException:
+            return data
+        if r.status_code == 304 and data is not None:
+            self._record(number, data, entry["etag"], write=False)
+            return data
+        if r.status_code == 404:
+            self._record(number, None)
+            return None
+        if not r.ok:
+            # Errors are not cached, the next lookup tries again
+            return data
+
+        self._record(number, r.content, r.headers.get("ETag"))
+        return r.content
+
+    def _lookup(self, number: int, session=None) -> bytes | None:
+        if self.local_dir is not None:
+            try:
+                with open(self._path(self.local_dir, number), "rb") as f:
+                    return f.read()
+            except FileNotFoundError:
+                pass
+
+        entry = self.index.get(str(number))
+        data = self._read_cached(number, entry)
+        valid = entry is not None and (entry["sha256"] is None or data is not None)
+        if valid and self.max_age is not None:
+            valid = time.time() - entry["checked"] <= self.max_age
+        if valid or self.base_url is None:
+            return data
+        return self._fetch(number, entry, data, session)
+
+    def _get(self, card_id: int, alias: int = 0, session=None) -> str | None:
+        for number in [card_id, alias] if alias else [card_id]:
+            data = self._lookup(number, session)
+            if data is not None:
+                return data.decode("utf-8", errors="replace")
+        return None
+
+    def get(self, card_id: int, alias: int = 0) -> str | None:
+        script = self._get(card_id, alias)
+        self._save_index()
+        return script
+
+    def prefetch(
+        self, cards: Iterable[tuple[int, int]], workers: int = SCRIPT_WORKERS
+    ) -> dict[int, str | None]:
+        """Look up the scripts of many (card id, alias) pairs concurrently.
+
+        Missing scripts are downloaded on a pooled session by workers
+        threads, the index is written once at the end.
+        """
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        cards = dict(cards)
+        with requests.Session() as session:
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=workers)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            with ThreadPoolExecutor(workers) as executor:
+                scripts = executor.map(
+                    lambda card: self._get(*card, session), cards.items()
+                )
+                scripts = dict(zip(cards, scripts))
+
+        self._save_index()
+        return scripts
+
+
+_script_cache: ScriptCache | None = None
+
+
+def get_script_cache() -> ScriptCache:
+    # Cache used by Card.script, created with the defaults on first use
+    global _script_cache
+    if _script_cache is None:
+        _script_cache = ScriptCache()
+    return _script_cache
+
+
+def set_script_cache(cache: ScriptCache):
+    global _script_cache
+    _script_cache = cache
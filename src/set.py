@@ -1,6 +1,9 @@
 from dataclasses import dataclass
 from datetime import datetime
-from typing import Optional
+from operator import attrgetter
+from typing import Iterable, Optional
+
+from .records import to_records
 
 
 @dataclass()
@@ -10,7 +13,16 @@ class Set:
     abbr: str
     _tcgdate: int = 0
     _ocgdate: int = 0
-    _contents_data: str = ""
+    _contents_data: str | list[int] = ""
+
+    def __post_init__(self):
+        # Queries hand over a comma separated string, parse it once
+        if not isinstance(self._contents_data, list):
+            self._contents_data = [
+                int(card_id)
+                for card_id in (self._contents_data or "").split(",")
+                if card_id
+            ]
 
     def __hash__(self) -> int:
         return hash(self.name)
@@ -22,21 +34,14 @@ class Set:
         return self.name
 
     def __contains__(self, card_id: int) -> bool:
-        return card_id in self.contents
+        return card_id in self._contents_data
 
     def to_dict(self) -> dict:
-        return {
-            "id": self.id,
-            "name": self.name,
-            "abbr": self.abbr,
-            "contents": self.contents,
-        }
+        return {key: get(self) for key, get in SET_SCHEMA}
 
     @property
-    def contents(self):
-        if not self._contents_data:
-            return []
-        return [int(card_id) for card_id in self._contents_data.split(",")]
+    def contents(self) -> list[int]:
+        return list(self._contents_data)
 
     @property
     def ocgdate(self) -> Optional[datetime]:
@@ -71,3 +76,17 @@ class Set:
     @property
     def set_total(self) -> int:
         return len(self._contents_data)
+
+
+SET_SCHEMA = [
+    ("id", attrgetter("id")),
+    ("name", attrgetter("name")),
+    ("abbr", attrgetter("abbr")),
+    ("contents", attrgetter("contents")),
+]
+
+
+def sets_to_records(
+    sets: Iterable[Set], fields: Iterable[str] | None = None, as_json: bool = False
+) -> list[dict] | bytes:
+    return to_records(sets, SET_SCHEMA, fields, as_json)
@@ -0,0 +1,287 @@
+import mmap
+import os
+import struct
+from functools import cached_property
+from typing import Iterable, Iterator
+
+import numpy as np
+
+from .card import Card
+from .columnar import ColumnarEngine, text_column
+
+SNAPSHOT_MAGIC = b"YUGISNAP"
+SNAPSHOT_VERSION = 2
+
+# magic, version, key length, card count, records offset, heap offset
+SNAPSHOT_HEADER = struct.Struct("<8sHHIQQ")
+
+# Fixed-width little-endian card records. Strings live in the heap and are
+# referenced by offset and length, a length of -1 stands for NULL.
+SNAPSHOT_DTYPE = np.dtype(
+    [
+        ("id", "<i8"),
+        ("type", "<i8"),
+        ("race", "<i8"),
+        ("attribute", "<i8"),
+        ("category", "<i8"),
+        ("genre", "<i8"),
+        ("level", "<i8"),
+        ("atk", "<i8"),
+        ("def_", "<i8"),
+        ("tcgdate", "<i8"),
+        ("ocgdate", "<i8"),
+        ("ot", "<i8"),
+        ("setcode", "<i8"),
+        ("support", "<i8"),
+        ("alias", "<i8"),
+        ("koid", "<i8"),
+        ("rarity", "<i8"),
+        ("script", "<i8"),
+        ("name_offset", "<u4"),
+        ("name_length", "<i4"),
+        ("desc_offset", "<u4"),
+        ("desc_length", "<i4"),
+        ("sets_offset", "<u4"),
+        ("sets_length", "<i4"),
+        ("script_offset", "<u4"),
+        ("script_length", "<i4"),
+        ("script_kind", "u1"),
+        ("has_koid", "u1"),
+        ("has_rarity", "u1"),
+        ("_padding", "V5"),
+    ]
+)
+
+# How the script field of a record is stored
+SCRIPT_NULL, SCRIPT_INT, SCRIPT_BYTES, SCRIPT_STR = range(4)
+
+# Record fields that point into the heap
+SNAPSHOT_STRINGS = ["name", "desc", "sets", "script"]
+
+
+def write_snapshot(path: str, cards: Iterable[Card], key: str = ""):
+    """Write cards to path as a snapshot that CardSnapshot.open can map."""
+    cards = sorted(cards, key=lambda card: card.id)
+    records = np.zeros(len(cards), dtype=SNAPSHOT_DTYPE)
+    heap = bytearray()
+
+    def put(value) -> tuple[int, int]:
+        if value is None:
+            return 0, -1
+        data = value.encode() if isinstance(value, str) else bytes(value)
+        offset = len(heap)
+        heap.extend(data)
+        return offset, len(data)
+
+    for record, card in zip(records, cards):
+        record["id"] = card.id
+        record["type"] = card._typedata
+        record["race"] = card._racedata
+        record["attribute"] = card._attributedata
+        record["category"] = card._categorydata
+        record["genre"] = card._genredata
+        record["level"] = card._leveldata
+        record["atk"] = card._atkdata
+        record["def_"] = card._defdata
+        record["tcgdate"] = card._tcgdatedata
+        record["ocgdate"] = card._ocgdatedata
+        record["ot"] = card.status
+        record["setcode"] = card._archcode
+        record["support"] = card._supportcode
+        record["alias"] = card.alias
+
+        if card.koid is not None:
+            record["koid"] = card.koid
+            record["has_koid"] = 1
+
+        if card._raritydata is not None:
+            record["rarity"] = card._raritydata
+            record["has_rarity"] = 1
+
+        record["name_offset"], record["name_length"] = put(card.name)
+        record["desc_offset"], record["desc_length"] = put(card._textdata)
+        record["sets_offset"], record["sets_length"] = put(card._setdata)
+
+        script = card._scriptdata
+        if isinstance(script, int):
+            record["script"] = script
+            record["script_kind"] = SCRIPT_INT
+        elif script is not None:
+            record["script_offset"], record["script_length"] = put(script)
+            record["script_kind"] = (
+                SCRIPT_STR if isinstance(script, str) else SCRIPT_BYTES
+            )
+
+    key_data = key.encode()
+    records_offset = SNAPSHOT_HEADER.size + len(key_data)
+    records_offset += -records_offset % 8
+    heap_offset = records_offset + records.nbytes
+    header = SNAPSHOT_HEADER.pack(
+        SNAPSHOT_MAGIC,
+        SNAPSHOT_VERSION,
+        len(key_data),
+        len(records),
+        records_offset,
+        heap_offset,
+    )
+
+    # Write next to the target and swap it in, readers never see half a file
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(header)
+        f.write(key_data)
+        f.write(b"\0" * (records_offset - f.tell()))
+        f.write(records.tobytes())
+        f.write(heap)
+    os.replace(tmp_path, path)
+
+
+class CardSnapshot(ColumnarEngine):
+    """Read-only card pool mapped from a snapshot file.
+
+    Integer columns are views into the mapped records, strings are decoded
+    from the heap when a card or a string column is first needed.
+    """
+
+    def __init__(self, buffer, key: str, records: np.ndarray, heap: memoryview):
+        self._buffer = buffer
+        self.key = key
+        self.records = records
+        self.heap = heap
+
+        for column in [
+            "id",
+            "type",
+            "race",
+            "attribute",
+            "category",
+            "genre",
+            "level",
+            "atk",
+            "def_",
+            "tcgdate",
+            "ocgdate",
+            "ot",
+            "setcode",
+            "support",
+        ]:
+            setattr(self, column, records[column])
+
+        self.koid = np.ma.masked_array(records["koid"], mask=records["has_koid"] == 0)
+
+    @classmethod
+    def open(cls, path: str, key: str | None = None) -> "CardSnapshot":
+        with open(path, "rb") as f:
+            buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if len(buffer) < SNAPSHOT_HEADER.size:
+            raise ValueError(f"Truncated card snapshot: {path}")
+        magic, version, key_length, count, records_offset, heap_offset = (
+            SNAPSHOT_HEADER.unpack_from(buffer)
+        )
+        if magic != SNAPSHOT_MAGIC or version != SNAPSHOT_VERSION:
+            raise ValueError(f"Not a version {SNAPSHOT_VERSION} card snapshot: {path}")
+
+        snapshot_key = bytes(
+            buffer[SNAPSHOT_HEADER.size : SNAPSHOT_HEADER.size + key_length]
+        ).decode()
+        if key is not None and key != snapshot_key:
+            raise ValueError(f"Snapshot {path} is stale")
+
+        if records_offset + count * SNAPSHOT_DTYPE.itemsize > len(buffer):
+            raise ValueError(f"Truncated card snapshot: {path}")
+        records = np.frombuffer(
+            buffer, dtype=SNAPSHOT_DTYPE, count=count, offset=records_offset
+        )
+        heap = memoryview(buffer)[heap_offset:]
+
+        # A partially written heap cuts off the last strings
+        heap_end = max(
+            (
+                records[f"{column}_offset"].astype(np.int64)
+                + np.maximum(records[f"{column}_length"], 0)
+            ).max(initial=0)
+            for column in SNAPSHOT_STRINGS
+        )
+        if heap_end > len(heap):
+            raise ValueError(f"Truncated card snapshot: {path}")
+        return cls(buffer, snapshot_key, records, heap)
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def _string(self, offset: int, length: int) -> str | None:
+        if length < 0:
+            return None
+        return str(self.heap[offset : offset + length], "utf-8")
+
+    def _string_column(self, column: str) -> np.ndarray:
+        offsets = self.records[f"{column}_offset"]
+        lengths = self.records[f"{column}_length"]
+        return text_column([self._string(o, l) for o, l in zip(offsets, lengths)])
+
+    @cached_property
+    def name(self) -> np.ndarray:
+        return self._string_column("name")
+
+    @cached_property
+    def desc(self) -> np.ndarray:
+        return self._string_column("desc")
+
+    def _make_card(self, i: int) -> Card:
+        record = self.records[i]
+
+        kind = record["script_kind"]
+        if kind == SCRIPT_INT:
+            script = int(record["script"])
+        elif kind == SCRIPT_NULL:
+            script = None
+        else:
+            offset, length = record["script_offset"], record["script_length"]
+            script = bytes(self.heap[offset : offset + length])
+            if kind == SCRIPT_STR:
+                script = script.decode()
+
+        return Card(
+            int(record["id"]),
+            self._string(record["name_offset"], record["name_length"]),
+            self._string(record["desc_offset"], record["desc_length"]),
+            int(record["type"]),
+            int(record["race"]),
+            int(record["attribute"]),
+            int(record["category"]),
+            int(record["genre"]),
+            int(record["level"]),
+            int(record["atk"]),
+            int(record["def_"]),
+            int(record["tcgdate"]),
+            int(record["ocgdate"]),
+            int(record["ot"]),
+            int(record["setcode"]),
+            int(record["support"]),
+            int(record["alias"]),
+            script,
+            int(record["koid"]) if record["has_koid"] else None,
+            int(record["rarity"]) if record["has_rarity"] else None,
+            self._string(record["sets_offset"], record["sets_length"]),
+        )
+
+    def _make_cards(self, indices) -> list[Card]:
+        return [self._make_card(i) for i in indices]
+
+    def iter_cards(self) -> Iterator[Card]:
+        for i in range(len(self)):
+            yield self._make_card(i)
+
+    def get_card_by_id(self, card_id: int) -> Card | None:
+        i = np.searchsorted(self.id, int(card_id))
+        if i < len(self) and self.id[i] == int(card_id):
+            return self._make_card(i)
+        return None
+
+    def get_cards_by_ids(self, card_ids) -> list[Card]:
+        card_ids = np.unique(np.asarray(list(card_ids), dtype=np.int64))
+        indices = np.searchsorted(self.id, card_ids)
+        found = indices < len(self)
+        found[found] &= self.id[indices[found]] == card_ids[found]
+        return self._make_cards(indices[found])
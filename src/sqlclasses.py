@@ -1,4 +1,4 @@
-from sqlalchemy import BLOB, Column, ForeignKey, Integer, Text, func
+from sqlalchemy import BLOB, Column, ForeignKey, Index, Integer, Text, func
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.ext.hybrid import hybrid_property
 
@@ -93,6 +93,7 @@ class Packs(Base):
 
 class Relations(Base):
     __tablename__ = "relations"
+    __table_args__ = (Index("ix_relations_cardid", "cardid"),)
 
     cardid = Column(
         Integer,
@@ -121,3 +122,24 @@ class Rarities(Base):
         Integer,
         nullable=False,
     )
+
+
+class CardArchetypes(Base):
+    # Derived from Datas.setcode and Datas.support by YugiDB, role is one of
+    # "member", "support" or "related".
+    __tablename__ = "card_archetypes"
+    __table_args__ = (Index("ix_card_archetypes_archid_role", "archid", "role"),)
+
+    cardid = Column(Integer, primary_key=True, nullable=False)
+    archid = Column(Integer, primary_key=True, nullable=False)
+    role = Column(Text, primary_key=True, nullable=False)
+
+
+class TextsFts(Base):
+    # FTS5 trigram index over Texts.name and Texts.desc, built by YugiDB.
+    # The rowid is the card id.
+    __tablename__ = "texts_fts"
+
+    rowid = Column(Integer, primary_key=True)
+    name = Column(Text)
+    desc = Column(Text)
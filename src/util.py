@@ -1,6 +1,33 @@
-from functools import wraps
+import re
+from collections import OrderedDict
+from enum import IntFlag
+from functools import lru_cache, wraps
+
 from sqlalchemy.exc import NoResultFound
 
+FILTER_OPS = ["!=", ">=", "<=", ">", "<"]
+
+
+def parse_order_by(order_by: str) -> tuple[str, bool]:
+    # "atk" sorts ascending, "-atk" descending
+    descending = order_by.startswith("-")
+    return order_by.lstrip("-").lower(), descending
+
+
+def escape_like(value: str) -> str:
+    # LIKE pattern matching value literally, for use with escape="\\"
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+@lru_cache(maxsize=1024)
+def like_regex(pattern: str) -> re.Pattern:
+    # Regex matching strings the way SQLite's LIKE matches pattern: % and _
+    # are wildcards and only ASCII letters compare case-insensitively
+    translated = "".join(
+        ".*" if c == "%" else "." if c == "_" else re.escape(c) for c in pattern
+    )
+    return re.compile(translated, re.ASCII | re.IGNORECASE | re.DOTALL)
+
 
 def handle_no_result(func):
     @wraps(func)
@@ -13,3 +40,87 @@ def handle_no_result(func):
     return wrapper
 
 
+class LRUCache:
+    def __init__(self, maxsize: int = 1024):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __contains__(self, key) -> bool:
+        return key in self._data
+
+    def get(self, key, default=None):
+        if key not in self._data:
+            self.misses += 1
+            return default
+
+        self.hits += 1
+        self._data.move_to_end(key)
+        return self._data[key]
+
+    def put(self, key, value) -> None:
+        if self.maxsize <= 0:
+            return
+
+        self._data[key] = value
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def pop(self, key, default=None):
+        return self._data.pop(key, default)
+
+    def clear(self) -> None:
+        self._data.clear()
+
+    @property
+    def stats(self) -> dict:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+        }
+
+
+def normalize_filter_value(values: int | str | list[IntFlag] | IntFlag) -> str:
+    if isinstance(values, str):
+        return values.lower()
+    elif isinstance(values, list) and all(
+        isinstance(value, IntFlag) for value in values
+    ):
+        return ",".join([value.name.lower() for value in values if value.name])
+    elif isinstance(values, IntFlag) and values.name:
+        return str(values.name.lower())
+    elif isinstance(values, int):
+        return str(values)
+    else:
+        raise TypeError("Invalid type for value")
+
+
+@lru_cache(maxsize=1024)
+def parse_filter_value(values: str) -> tuple[tuple[tuple[bool, str, str], ...], ...]:
+    # Values are ORed on "|" and ANDed on ",", each term being a
+    # (negated, operator, value) tuple.
+    def parse_term(value: str):
+        negated = value.startswith("~")
+        value = value.lstrip("~")
+
+        op = next((x for x in FILTER_OPS if value.startswith(x)), "==")
+        value = value.lstrip("><=!")
+
+        return negated, op, value
+
+    return tuple(
+        tuple(parse_term(value) for value in and_values.split(","))
+        for and_values in values.split("|")
+    )
+
+
+@lru_cache(maxsize=None)
+def enum_members(enum_class: type[IntFlag]) -> dict[str, IntFlag]:
+    return {k.casefold(): v for k, v in enum_class.__members__.items()}
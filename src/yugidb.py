@@ -1,25 +1,179 @@
+import logging
 import os
-from typing import Callable
-
-from sqlalchemy import and_, create_engine, false, func, inspect, or_, true
-from sqlalchemy.exc import IntegrityError, MultipleResultsFound, NoResultFound
-from sqlalchemy.orm import sessionmaker
+import sqlite3
+from contextlib import closing, contextmanager
+from copy import copy
+from dataclasses import dataclass, field
+from itertools import islice
+from pathlib import Path
+from typing import Callable, Iterable, Iterator, Literal
+
+from sqlalchemy import (
+    Integer,
+    and_,
+    bindparam,
+    column as sql_column,
+    create_engine,
+    delete,
+    event,
+    false,
+    func,
+    insert,
+    inspect,
+    literal,
+    or_,
+    select,
+    table as sql_table,
+    text,
+    true,
+    union,
+)
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import (
+    IntegrityError,
+    MultipleResultsFound,
+    NoResultFound,
+    OperationalError,
+)
+from sqlalchemy.orm import Query, sessionmaker
+from sqlalchemy.pool import StaticPool
 
 from .archetype import Archetype
-from .card import Card
+from .card import Card, PartialCard
+from .cardtable import CardTable
+from .columnar import ColumnarEngine
 from .constants import *
+from .diff import DatabaseDelta
 from .enums import *
+from .exporter import (
+    EXPORT_CHUNK_SIZE,
+    ExportFormat,
+    export_cards,
+    guess_export_format,
+)
+from .importer import ImportFormat, decode_records, guess_format, read_records
+from .scripts import SCRIPT_WORKERS, ScriptCache, get_script_cache
 from .set import Set
+from .snapshot import write_snapshot
 from .sqlclasses import *
-from .util import handle_no_result
+from .util import (
+    LRUCache,
+    enum_members,
+    escape_like,
+    handle_no_result,
+    normalize_filter_value,
+    parse_filter_value,
+    parse_order_by,
+)
+
+logger = logging.getLogger(__name__)
 
 Cardquery = Callable[[Card], bool]
 
+QUERY_PLAN_CACHE_SIZE = 512
+WRITE_CHUNK_SIZE = 500
+IMPORT_CHUNK_SIZE = 5000
+ITER_CHUNK_SIZE = 1000
+CARD_CACHE_SIZE = 4096
+
+# Card tables copied by import_cards from cdb files, with their card id column
+IMPORT_TABLES = {
+    "datas": "id",
+    "texts": "id",
+    "koids": "id",
+    "rarities": "id",
+    "relations": "cardid",
+}
+
+# Applied on connect for all modes but "readwrite".
+READ_PRAGMAS = {
+    "mmap_size": 268435456,
+    "cache_size": -65536,
+    "temp_store": "memory",
+    "query_only": 1,
+}
+
+OpenMode = Literal["readwrite", "readonly", "immutable", "memory"]
+
+# Keep texts_fts in sync with every write to texts, the rowid is the card id
+TEXT_INDEX_TRIGGERS = {
+    "texts_fts_insert": (
+        "AFTER INSERT ON texts BEGIN "
+        'INSERT INTO texts_fts (rowid, name, "desc") '
+        'VALUES (new.id, new.name, new."desc"); END'
+    ),
+    "texts_fts_delete": (
+        "AFTER DELETE ON texts BEGIN " "DELETE FROM texts_fts WHERE rowid = old.id; END"
+    ),
+    "texts_fts_update": (
+        "AFTER UPDATE ON texts BEGIN "
+        "DELETE FROM texts_fts WHERE rowid = old.id; "
+        'INSERT INTO texts_fts (rowid, name, "desc") '
+        'VALUES (new.id, new.name, new."desc"); END'
+    ),
+}
+
+# Archetype chunks of a datas row by card_archetypes role, as
+# (column, bit offset) pairs, see Datas.archetypes
+_ARCHETYPE_CHUNKS = {
+    "member": [("setcode", 0), ("setcode", 16), ("setcode", 32), ("setcode", 48)],
+    "support": [("support", 0), ("support", 16)],
+    "related": [("support", 32), ("support", 48)],
+}
+
+_ARCHETYPE_INDEX_ROWS = (
+    "DELETE FROM card_archetypes WHERE cardid = new.id; "
+    "INSERT OR IGNORE INTO card_archetypes (cardid, archid, role) "
+    "SELECT new.id, archid, role FROM ("
+    + " UNION ".join(
+        f"SELECT (new.{column} >> {offset}) & 65535 AS archid, '{role}' AS role"
+        for role, chunks in _ARCHETYPE_CHUNKS.items()
+        for column, offset in chunks
+    )
+    + ") WHERE archid != 0; "
+)
+
+# Keep card_archetypes in sync with every write to datas. Inserts clear
+# the card's rows first, INSERT OR REPLACE does not fire the delete trigger.
+ARCHETYPE_INDEX_TRIGGERS = {
+    "card_archetypes_insert": (
+        f"AFTER INSERT ON datas BEGIN {_ARCHETYPE_INDEX_ROWS}END"
+    ),
+    "card_archetypes_delete": (
+        "AFTER DELETE ON datas BEGIN "
+        "DELETE FROM card_archetypes WHERE cardid = old.id; END"
+    ),
+    "card_archetypes_update": (
+        "AFTER UPDATE OF id, setcode, support ON datas BEGIN "
+        "DELETE FROM card_archetypes WHERE cardid = old.id; "
+        f"{_ARCHETYPE_INDEX_ROWS}END"
+    ),
+}
+
+# Trigram MATCH queries need phrases of at least this many characters
+TEXT_INDEX_MIN_PHRASE = 3
+
+
+@dataclass
+class WriteResult:
+    written: list[int] = field(default_factory=list)
+    failed: dict[int, str] = field(default_factory=dict)
+    # Imported records that had no card id to write them under
+    skipped: int = 0
+
 
 class YugiDB:
-    def __init__(self, connection_string: str):
+    def __init__(
+        self,
+        connection_string: str,
+        columnar: bool = False,
+        mode: OpenMode = "readwrite",
+        card_cache_size: int = CARD_CACHE_SIZE,
+    ):
         self.name = os.path.basename(connection_string)
-        self.engine = create_engine(connection_string)
+        self.mode = mode
+        self.engine = self._create_engine(connection_string, mode)
         Session = sessionmaker(bind=self.engine)
         self.session = Session()
 
@@ -27,64 +181,291 @@ class YugiDB:
         self.has_packs = all(self.has_table(x) for x in ["packs", "relations"])
         self.has_rarities = self.has_table("rarities")
 
+        # Opt-in in-memory engine for get_cards_by_values, built on first use.
+        self.columnar = columnar
+        self._columnar_engine = None
+
+        # Filter queries keyed on their shape, values are bound per call.
+        self._query_plans: dict[tuple, Query] = {}
+
+        # Cards by id for get_card_by_id and get_cards_by_ids, callers get
+        # copies so they can modify them freely.
+        self.card_cache = LRUCache(card_cache_size)
+
+        # Sets by id and pack ids by card id for get_sets_for_cards
+        self._set_cache: dict[int, Set] | None = None
+        self._card_packs: dict[int, list[int]] = {}
+
+        with self._derived_tables():
+            self.has_archetype_index = self.has_table(
+                "card_archetypes"
+            ) and self._has_triggers(ARCHETYPE_INDEX_TRIGGERS)
+            if not self.has_archetype_index:
+                self.build_archetype_index()
+
+            self.has_text_index = self.has_table("texts_fts") and self._has_triggers(
+                TEXT_INDEX_TRIGGERS
+            )
+            if not self.has_text_index:
+                self.build_text_index()
+
+            if self.has_packs:
+                self.build_relations_index()
+
+    @staticmethod
+    def _create_engine(connection_string: str, mode: OpenMode):
+        if mode == "readwrite":
+            return create_engine(connection_string)
+
+        path = Path(make_url(connection_string).database).absolute()
+        pragmas = READ_PRAGMAS.copy()
+
+        if mode == "readonly":
+            engine = create_engine(connection_string)
+        elif mode == "immutable":
+            engine = create_engine(
+                "sqlite://",
+                creator=lambda: sqlite3.connect(
+                    f"{path.as_uri()}?mode=ro&immutable=1",
+                    uri=True,
+                    check_same_thread=False,
+                ),
+            )
+        elif mode == "memory":
+
+            def copy_to_memory():
+                # Copy the database file into memory with the backup API
+                memory = sqlite3.connect(":memory:", check_same_thread=False)
+                uri = f"{path.as_uri()}?mode=ro"
+                with closing(sqlite3.connect(uri, uri=True)) as source:
+                    source.backup(memory)
+                return memory
+
+            # A single shared connection, each new one would be a new copy
+            engine = create_engine(
+                "sqlite://", creator=copy_to_memory, poolclass=StaticPool
+            )
+        else:
+            raise ValueError(f"Invalid open mode: {mode}")
+
+        @event.listens_for(engine, "connect")
+        def set_pragmas(dbapi_connection, _):
+            cursor = dbapi_connection.cursor()
+            for pragma, value in pragmas.items():
+                cursor.execute(f"PRAGMA {pragma} = {value}")
+            cursor.close()
+
+        return engine
+
+    @contextmanager
+    def _derived_tables(self):
+        # The in-memory copy is query_only like the other read modes, except
+        # while its derived tables are built. Every new copy gets the pragma
+        # on connect, so it still holds after the engine is disposed.
+        if self.mode == "memory":
+            self.session.execute(text("PRAGMA query_only = 0"))
+        try:
+            yield
+        finally:
+            if self.mode == "memory":
+                self.session.execute(text("PRAGMA query_only = 1"))
+
+    def close(self):
+        # Pooled connections keep the database file open, a closed YugiDB
+        # can still be used and reconnects on the next query.
+        self.session.close()
+        self.engine.dispose()
+
     def has_table(self, table_name: str):
         return inspect(self.engine).has_table(table_name)
 
-    def _build_query(
+    def refresh(self, delta: DatabaseDelta | None = None):
+        # Rebuilds derived tables and drops cached state after the underlying
+        # database file has been replaced. With a delta only the cached cards
+        # and sets it names are dropped.
+        self.session.expire_all()
+        self._columnar_engine = None
+        self._query_plans.clear()
+        self._set_cache = None
+
+        if delta is None:
+            self.card_cache.clear()
+            self._card_packs.clear()
+        else:
+            for card_id in delta.cards:
+                self.card_cache.pop(card_id)
+                self._card_packs.pop(card_id, None)
+            if delta.sets:
+                self._card_packs.clear()
+
+        with self._derived_tables():
+            self.build_archetype_index()
+            self.build_text_index()
+
+    def build_archetype_index(self):
+        # Materializes the archetype chunks of Datas.setcode and Datas.support
+        # into card_archetypes, so archetype lookups can use an index.
+        # Triggers on datas keep it in sync.
+        try:
+            CardArchetypes.__table__.create(self.engine, checkfirst=True)
+            self.session.execute(delete(CardArchetypes))
+            self.session.execute(self._archetype_index_insert())
+            self._create_triggers(ARCHETYPE_INDEX_TRIGGERS)
+            self.session.commit()
+            self.has_archetype_index = True
+        except OperationalError:
+            # Read-only databases fall back to matching on Datas.setcode
+            self.session.rollback()
+            self.has_archetype_index = False
+
+    def _has_triggers(self, triggers: dict[str, str]) -> bool:
+        names = self.session.execute(
+            text("SELECT name FROM sqlite_master WHERE type = 'trigger'")
+        )
+        return set(triggers) <= {name for name, in names}
+
+    def _create_triggers(self, triggers: dict[str, str]):
+        for name, trigger in triggers.items():
+            self.session.execute(text(f"DROP TRIGGER IF EXISTS {name}"))
+            self.session.execute(text(f"CREATE TRIGGER {name} {trigger}"))
+
+    def build_text_index(self):
+        # Trigram tokenized FTS5 index over card names and texts, which also
+        # serves substring LIKE queries. Triggers on texts keep it in sync.
+        # Requires SQLite 3.34 or newer.
+        try:
+            self.session.execute(text("DROP TABLE IF EXISTS texts_fts"))
+            self.session.execute(
+                text(
+                    "CREATE VIRTUAL TABLE texts_fts "
+                    "USING fts5(name, \"desc\", tokenize='trigram')"
+                )
+            )
+            self.session.execute(
+                insert(TextsFts).from_select(
+                    ["rowid", "name", "desc"],
+                    select(Texts.id, Texts.name, Texts.desc),
+                )
+            )
+            self._create_triggers(TEXT_INDEX_TRIGGERS)
+            self.session.commit()
+            self.has_text_index = True
+        except OperationalError:
+            # Read-only databases and SQLite builds without FTS5 fall back to
+            # scanning texts.
+            self.session.rollback()
+            self.has_text_index = False
+
+    def build_relations_index(self):
+        # Card to set lookups filter relations on cardid. The Omega schema
+        # already covers that with its (cardid, packid) primary key.
+        inspector = inspect(self.engine)
+        indexed = [
+            index["column_names"][:1] for index in inspector.get_indexes("relations")
+        ]
+        indexed.append(
+            inspector.get_pk_constraint("relations")["constrained_columns"][:1]
+        )
+        if ["cardid"] in indexed:
+            return
+
+        try:
+            for index in Relations.__table__.indexes:
+                index.create(self.engine, checkfirst=True)
+        except OperationalError:
+            # Read-only databases scan relations instead
+            pass
+
+    def _archetype_index_insert(self):
+        selects = [
+            select(Datas.id, column, literal(role)).where(column != 0)
+            for role, columns in archetype_roles.items()
+            for column in columns
+        ]
+        return insert(CardArchetypes).from_select(
+            ["cardid", "archid", "role"], union(*selects)
+        )
+
+    def _archetype_filter(self, arch_id, role: str = "member"):
+        if self.has_archetype_index:
+            return Datas.id.in_(
+                select(CardArchetypes.cardid).where(
+                    CardArchetypes.archid == arch_id, CardArchetypes.role == role
+                )
+            )
+        return or_(val.op("==")(arch_id) for val in archetype_roles[role])
+
+    def _bind_query(
         self,
         params: dict[str, int | str | list[IntFlag] | IntFlag],
         key: str,
-        column,
         valuetype: type = str,
-        condition=true(),
         special={},
+        **_,
     ):
+        # Splits a filter value into its query shape and bound parameters,
+        # so queries that only differ in their values share one plan.
         values = params.get(key)
 
         if not values:
-            return None
-
-        if isinstance(values, str):
-            conv_values = values.lower()
-        elif isinstance(values, list) and all(
-            isinstance(value, IntFlag) for value in values
-        ):
-            conv_values = ",".join(
-                [value.name.lower() for value in values if value.name]
-            )
-        elif isinstance(values, IntFlag) and values.name:
-            conv_values = str(values.name.lower())
-        elif isinstance(values, int):
-            conv_values = str(values)
-        else:
-            raise TypeError("Invalid type for value")
+            return None, {}
+
+        shape = []
+        binds = {}
+        for i, terms in enumerate(parse_filter_value(normalize_filter_value(values))):
+            and_shape = []
+            for j, (negated, op, value) in enumerate(terms):
+                name = f"{key}_{i}_{j}"
+                if value in special:
+                    and_shape.append((negated, op, value))
+                elif valuetype in ["substr", "fulltext"]:
+                    binds[name] = f"%{value}%"
+                    and_shape.append((negated, op, None))
+                elif valuetype == str:
+                    binds[name] = str(value)
+                    and_shape.append((negated, op, None))
+                elif valuetype == int:
+                    binds[name] = int(value)
+                    and_shape.append((negated, op, None))
+                else:
+                    and_shape.append((negated, op, value))
+            shape.append(tuple(and_shape))
 
-        def _build_subquery(value: str):
-            negated = value.startswith("~")
-            value = value.lstrip("~")
+        return tuple(shape), binds
 
-            ops = ["!=", ">=", "<=", ">", "<"]
-            op = next((x for x in ops if value.startswith(x)), "==")
-            value = value.lstrip("><=!")
+    def _build_query(
+        self,
+        shape: tuple[tuple[tuple[bool, str, str | None], ...], ...],
+        key: str,
+        column,
+        valuetype: type = str,
+        condition=true(),
+        special={},
+    ):
+        def _build_subquery(i: int, j: int, term: tuple[bool, str, str | None]):
+            negated, op, value = term
+            name = f"{key}_{i}_{j}"
 
             if value in special:
                 # Handle special query values
                 subquery = special[value]
             elif valuetype == "substr":
                 # Handle substring queries
-                subquery = column.ilike(f"%{value}%")
+                subquery = column.ilike(bindparam(name))
+            elif valuetype == "fulltext":
+                # Handle substring queries through the card text index
+                subquery = Datas.id.in_(
+                    select(TextsFts.rowid).where(column.like(bindparam(name)))
+                )
             elif valuetype == str:
                 # Handle exact string queries
-                subquery = column.op("==")(str(value))
+                subquery = column.op("==")(bindparam(name))
             elif valuetype == int:
                 # Handle integer queries
-                subquery = column.op(op)(int(value))
+                subquery = column.op(op)(bindparam(name, type_=Integer))
             elif issubclass(valuetype, IntFlag):
                 # Handle queries for specific types
-                type_modifier = {
-                    k.casefold(): v for k, v in valuetype.__members__.items()
-                }
-                subquery = column.op("&")(type_modifier[value])
+                subquery = column.op("&")(enum_members(valuetype)[value])
             else:
                 raise TypeError("Invalid type for value")
 
@@ -95,49 +476,81 @@ class YugiDB:
             return subquery
 
         # Apply AND to values
-        def map_and_values(values: str):
-            return and_(*map(_build_subquery, values.split(",")))
+        def map_and_values(i: int, terms: tuple[tuple[bool, str, str | None], ...]):
+            return and_(*(_build_subquery(i, j, term) for j, term in enumerate(terms)))
 
         # Apply OR to values
-        query = or_(*map(map_and_values, conv_values.split("|")))
+        query = or_(*(map_and_values(i, terms) for i, terms in enumerate(shape)))
 
         # AND with condition
         query = and_(condition, query)
 
         return query
 
-    ################# Card Functions #################
+    def _query_by_values(
+        self,
+        base_query: str,
+        filter_params: list,
+        params: dict,
+        fields: tuple[str, ...] | None = None,
+    ):
+        # fields selects a lean projection of card_query
+        params = {k.lower(): v for k, v in params.items()}
 
-    @property
-    def card_query(self):
-        items = [
-            Datas.id,
-            Texts.name,
-            Texts.desc,
-            Datas.type,
-            Datas.race,
-            Datas.attribute,
-            Datas.category,
-            Datas.genre,
-            Datas.level,
-            Datas.atk,
-            Datas.def_,
-            Datas.tcgdate,
-            Datas.ocgdate,
-            Datas.ot,
-            Datas.setcode,
-            Datas.support,
-            Datas.alias,
-            Datas.script,
-        ]
+        plan_key = [base_query, fields]
+        binds = {}
+        for filter_param in filter_params:
+            shape, filter_binds = self._bind_query(params, **filter_param)
+            if shape is not None:
+                plan_key.append((filter_param["key"], shape))
+                binds |= filter_binds
+        plan_key = tuple(plan_key)
+
+        query = self._query_plans.get(plan_key)
+        if query is None:
+            shapes = dict(plan_key[2:])
+            filters = [
+                self._build_query(shapes[filter_param["key"]], **filter_param)
+                for filter_param in filter_params
+                if filter_param["key"] in shapes
+            ]
+            if fields is None:
+                query = getattr(self, base_query)
+            else:
+                query = self._card_query(fields, joins=shapes)
+            query = query.filter(*filters)
+            if len(self._query_plans) >= QUERY_PLAN_CACHE_SIZE:
+                self._query_plans.pop(next(iter(self._query_plans)))
+        else:
+            self._query_plans.pop(plan_key)
+        self._query_plans[plan_key] = query
 
-        if self.has_koids:
-            items.append(Koids.koid)
+        return query.params(binds)
 
-        if self.has_rarities:
-            items.append(Rarities.tcgrarity)
+    ################# Card Functions #################
 
-        if self.has_packs:
+    def _card_fields(self, projection: str | Iterable[str]) -> tuple[str, ...]:
+        if isinstance(projection, str):
+            if projection not in card_projections:
+                raise ValueError(f"Invalid projection: {projection}")
+            projection = card_projections[projection]
+
+        available = {
+            "koid": self.has_koids,
+            "rarity": self.has_rarities,
+            "sets": self.has_packs,
+        }
+        return tuple(
+            key
+            for key in card_fields
+            if (key == "id" or key in projection) and available.get(key, True)
+        )
+
+    def _card_query(self, fields: tuple[str, ...], joins: Iterable[str] = ()):
+        # joins lists outer joined tables that are filtered on but not selected
+        items = [card_fields[key]["column"] for key in fields if key != "sets"]
+
+        if "sets" in fields:
             subquery = (
                 self.session.query(
                     Relations.cardid, func.group_concat(Packs.id).label("sets")
@@ -151,14 +564,31 @@ class YugiDB:
                 self.session.query(*items, subquery.c.sets)
                 .join(Texts, Datas.id == Texts.id)
                 .outerjoin(subquery, Datas.id == subquery.c.cardid)
-                .group_by(Datas.id, Texts.name)
             )
         else:
-            query = (
-                self.session.query(*items)
-                .join(Texts, Datas.id == Texts.id)
-                .group_by(Datas.id, Texts.name)
-            )
+            query = self.session.query(*items).join(Texts, Datas.id == Texts.id)
+
+        if any(key in fields for key in ["koid", "rarity", "sets"]):
+            query = query.group_by(Datas.id, Texts.name)
+
+        if self.has_koids and ("koid" in fields or "koid" in joins):
+            query = query.outerjoin(Koids, Datas.id == Koids.id)
+
+        if self.has_rarities and "rarity" in fields:
+            query = query.outerjoin(Rarities, Datas.id == Rarities.id)
+
+        return query
+
+    @property
+    def card_query(self):
+        return self._card_query(self._card_fields("full"))
+
+    @property
+    def card_count_query(self):
+        # Same joins as card_query minus the sets subquery, counts ids only.
+        query = self.session.query(func.count(Datas.id)).join(
+            Texts, Datas.id == Texts.id
+        )
 
         if self.has_koids:
             query = query.outerjoin(Koids, Datas.id == Koids.id)
@@ -168,21 +598,61 @@ class YugiDB:
 
         return query
 
-    def _make_card(self, result) -> Card:
-        return Card(*result)
+    @property
+    def columnar_engine(self) -> ColumnarEngine:
+        if self._columnar_engine is None:
+            rows = self.card_query.yield_per(ITER_CHUNK_SIZE)
+            self._columnar_engine = ColumnarEngine(rows)
+        return self._columnar_engine
 
-    def _make_card_list(self, results) -> list[Card]:
-        return [self._make_card(result) for result in results]
+    @property
+    def card_table(self) -> CardTable:
+        # The card pool as columns, shared with the columnar engine
+        return self.columnar_engine.table
+
+    @property
+    def _card_filter_params(self) -> list[dict]:
+        if not self.has_text_index:
+            return card_filter_params
+
+        fulltext = {param["key"]: param for param in fulltext_filter_params}
+        return [fulltext.get(param["key"], param) for param in card_filter_params]
+
+    def _make_card(self, result, fields: tuple[str, ...] | None = None) -> Card:
+        if fields is None:
+            return Card(*result)
+
+        values = {
+            card_fields[key]["field"]: value for key, value in zip(fields, result)
+        }
+        return PartialCard.from_fields(values, self.get_card_by_id)
+
+    def _make_card_list(self, results, fields: tuple[str, ...] | None = None):
+        return [self._make_card(result, fields) for result in results]
+
+    def _iter_cards(
+        self, query, chunk_size: int, fields: tuple[str, ...] | None = None
+    ) -> Iterator[Card]:
+        for result in query.yield_per(chunk_size):
+            yield self._make_card(result, fields)
+
+    def _projection_fields(self, projection) -> tuple[str, ...] | None:
+        if projection is None:
+            return None
+
+        fields = self._card_fields(projection)
+        return None if fields == self._card_fields("full") else fields
 
     @property
     def cards(self) -> list[Card]:
         results = self.card_query.all()
         return self._make_card_list(results)
 
+    def iter_cards(self, chunk_size: int = ITER_CHUNK_SIZE) -> Iterator[Card]:
+        return self._iter_cards(self.card_query, chunk_size)
+
     def get_archetype_cards(self, arch: Archetype) -> list[Card]:
-        query = self.card_query.filter(
-            or_(val.op("==")(arch.id) for val in Datas.archetypes)
-        )
+        query = self.card_query.filter(self._archetype_filter(arch.id))
         results = query.all()
         return self._make_card_list(results)
 
@@ -196,32 +666,147 @@ class YugiDB:
     def get_cards_by_value(self, key: str, value: str | IntFlag | list[IntFlag]):
         return self.get_cards_by_values({key: value})
 
-    def get_cards_by_values(self, params: dict) -> list[Card]:
-        params = {k.lower(): v for k, v in params.items()}
-        filters = [
-            self._build_query(params, **filter_param)
-            for filter_param in card_filter_params
-        ]
+    def _paginate(
+        self,
+        query,
+        limit: int | None = None,
+        offset: int | None = None,
+        order_by: str | None = None,
+        after: Card | None = None,
+    ):
+        key, descending = parse_order_by(order_by or "id")
+        if key == "id":
+            column = Datas.id
+        elif key in card_order_params:
+            column = card_order_params[key]["column"]
+        else:
+            raise ValueError(f"Invalid order_by key: {key}")
 
-        if not filters:
-            return []
+        if after is not None:
+            # Keyset cursor, continue right after the given card.
+            if key == "id":
+                query = query.filter(
+                    Datas.id < after.id if descending else Datas.id > after.id
+                )
+            else:
+                value = card_order_params[key]["value"](after)
+                query = query.filter(
+                    or_(
+                        column < value if descending else column > value,
+                        and_(column == value, Datas.id > after.id),
+                    )
+                )
+
+        # Ties are always broken by ascending id, keeping pages stable.
+        if key == "id":
+            query = query.order_by(Datas.id.desc() if descending else Datas.id)
+        else:
+            query = query.order_by(column.desc() if descending else column, Datas.id)
+
+        return query.limit(limit).offset(offset)
 
-        filters = [filter for filter in filters if filter is not None]
+    def get_cards_by_values(
+        self,
+        params: dict,
+        limit: int | None = None,
+        offset: int | None = None,
+        order_by: str | None = None,
+        after: Card | None = None,
+        projection: str | Iterable[str] | None = None,
+    ) -> list[Card]:
+        if self.columnar:
+            return self.columnar_engine.get_cards_by_values(
+                params, limit, offset, order_by, after
+            )
 
-        query = self.card_query.filter(*filters)
+        fields = self._projection_fields(projection)
+        query = self._query_by_values(
+            "card_query", self._card_filter_params, params, fields
+        )
+        if limit is not None or offset or order_by or after is not None:
+            query = self._paginate(query, limit, offset, order_by, after)
         results = query.all()
-        return self._make_card_list(results)
+        return self._make_card_list(results, fields)
+
+    def count_cards_by_values(self, params: dict) -> int:
+        if self.columnar:
+            return self.columnar_engine.count_cards_by_values(params)
+
+        query = self._query_by_values(
+            "card_count_query", self._card_filter_params, params
+        )
+        return query.scalar()
+
+    def iter_cards_by_values(
+        self,
+        params: dict,
+        chunk_size: int = ITER_CHUNK_SIZE,
+        projection: str | Iterable[str] | None = None,
+    ) -> Iterator[Card]:
+        if self.columnar:
+            return self.columnar_engine.iter_cards_by_values(params)
+
+        fields = self._projection_fields(projection)
+        query = self._query_by_values(
+            "card_query", self._card_filter_params, params, fields
+        )
+        return self._iter_cards(query, chunk_size, fields)
+
+    def search_cards(self, phrase: str, limit: int | None = None) -> list[Card]:
+        # Cards whose name or text contain the phrase, best matches first.
+        # Phrases too short for trigrams scan texts like without the index.
+        if not self.has_text_index or len(phrase) < TEXT_INDEX_MIN_PHRASE:
+            pattern = f"%{escape_like(phrase)}%"
+            query = self.card_query.filter(
+                or_(
+                    Texts.name.ilike(pattern, escape="\\"),
+                    Texts.desc.ilike(pattern, escape="\\"),
+                )
+            ).limit(limit)
+            return self._make_card_list(query.all())
+
+        # Name matches weigh heavier than text matches
+        ranked = self.session.execute(
+            text(
+                "SELECT rowid FROM texts_fts WHERE texts_fts MATCH :phrase "
+                "ORDER BY bm25(texts_fts, 10.0, 1.0) LIMIT :limit"
+            ),
+            {"phrase": '"%s"' % phrase.replace('"', '""'), "limit": limit or -1},
+        )
+        card_ids = [card_id for card_id, in ranked]
+        cards = {card.id: card for card in self.get_cards_by_ids(card_ids)}
+        return [cards[card_id] for card_id in card_ids if card_id in cards]
 
     @handle_no_result
     def get_card_by_id(self, card_id):
-        query = self.card_query.filter(Datas.id == int(card_id))
-        result = query.one()
-        return self._make_card(result)
+        card_id = int(card_id)
+        card = self.card_cache.get(card_id)
+
+        if card is None:
+            query = self.card_query.filter(Datas.id == card_id)
+            result = query.one()
+            card = self._make_card(result)
+            self.card_cache.put(card_id, card)
+
+        return copy(card)
 
     def get_cards_by_ids(self, card_ids):
-        query = self.card_query.filter(Datas.id.in_(card_ids))
-        results = query.all()
-        return self._make_card_list(results)
+        cards = {}
+        missing = []
+        for card_id in sorted(set(int(card_id) for card_id in card_ids)):
+            card = self.card_cache.get(card_id)
+            if card is None:
+                missing.append(card_id)
+            else:
+                cards[card_id] = card
+
+        if missing:
+            query = self.card_query.filter(Datas.id.in_(missing))
+            for card in self._make_card_list(query.all()):
+                self.card_cache.put(card.id, card)
+                cards[card.id] = card
+
+        return [copy(cards[card_id]) for card_id in sorted(cards)]
 
     @handle_no_result
     def get_card_by_name(self, card_name):
@@ -253,6 +838,7 @@ class YugiDB:
                 card_data.tcgdate = card._tcgdatedata
                 card_data.ocgdate = card._ocgdatedata
                 card_data.ot = card.status
+                card_data.setcode = card._archcode
                 card_data.support = card._supportcode
                 card_data.alias = card.alias
                 card_data.script = card._scriptdata
@@ -271,6 +857,7 @@ class YugiDB:
                     tcgdate=card._tcgdatedata,
                     ocgdate=card._ocgdatedata,
                     ot=card.status,
+                    setcode=card._archcode,
                     support=card._supportcode,
                     alias=card.alias,
                     script=card._scriptdata,
@@ -291,7 +878,11 @@ class YugiDB:
                 koid_data = (
                     self.session.query(Koids).filter_by(id=card.id).one_or_none()
                 )
-                if koid_data:
+                if card._koiddata is None:
+                    # Cards without a koid have no row
+                    if koid_data:
+                        self.session.delete(koid_data)
+                elif koid_data:
                     koid_data.koid = card._koiddata
                 else:
                     new_koid = Koids(id=card.id, koid=card._koiddata)
@@ -302,7 +893,10 @@ class YugiDB:
                 rarity_data = (
                     self.session.query(Rarities).filter_by(id=card.id).one_or_none()
                 )
-                if rarity_data:
+                if card._raritydata is None:
+                    if rarity_data:
+                        self.session.delete(rarity_data)
+                elif rarity_data:
                     rarity_data.tcgrarity = card._raritydata
                 else:
                     new_rarity = Rarities(id=card.id, tcgrarity=card._raritydata)
@@ -310,48 +904,321 @@ class YugiDB:
 
             # Commit changes to the database
             self.session.commit()
-            print(f"Data for {card.name} successfully written to the database.")
+            self._columnar_engine = None
+            self.card_cache.pop(card.id)
+            logger.debug("Data for %s successfully written to the database.", card.name)
         except (IntegrityError, NoResultFound) as e:
             self.session.rollback()
-            print(f"Failed to write card data to the database: {e}")
+            logger.error("Failed to write card data to the database: %s", e)
+
+    def _card_rows(self, card: Card) -> dict[type, dict]:
+        rows = {
+            Datas: {
+                "id": card.id,
+                "type": card._typedata,
+                "race": card._racedata,
+                "attribute": card._attributedata,
+                "category": card._categorydata,
+                "genre": card._genredata,
+                "level": card._leveldata,
+                "atk": card._atkdata,
+                "def": card._defdata,
+                "tcgdate": card._tcgdatedata,
+                "ocgdate": card._ocgdatedata,
+                "ot": card.status,
+                "setcode": card._archcode,
+                "support": card._supportcode,
+                "alias": card.alias,
+                "script": card._scriptdata,
+            },
+            Texts: {"id": card.id, "name": card.name, "desc": card._textdata},
+        }
+
+        # NULL koids and rarities have no row, see _upsert_cards
+        if self.has_koids and card._koiddata is not None:
+            rows[Koids] = {"id": card.id, "koid": card._koiddata}
+
+        if self.has_rarities and card._raritydata is not None:
+            rows[Rarities] = {"id": card.id, "tcgrarity": card._raritydata}
+
+        return rows
+
+    def _upsert_rows(self, tables: dict[str, list[dict]]):
+        # Rows per table for the cards in tables["datas"]. Cards without a
+        # koids or rarities row lose their existing one, relations are
+        # replaced for every card when the tables include them.
+        available = {
+            "koids": self.has_koids,
+            "rarities": self.has_rarities,
+            "relations": self.has_packs,
+        }
+        card_ids = [row["id"] for row in tables.get("datas", [])]
+        for sql_class in [Koids, Rarities]:
+            written = {row["id"] for row in tables.get(sql_class.__tablename__, [])}
+            cleared = [card_id for card_id in card_ids if card_id not in written]
+            if available[sql_class.__tablename__] and cleared:
+                self.session.execute(delete(sql_class).where(sql_class.id.in_(cleared)))
+        if "relations" in tables and available["relations"]:
+            self.session.execute(
+                delete(Relations).where(Relations.cardid.in_(card_ids))
+            )
+
+        for table, rows in tables.items():
+            if not rows or not available.get(table, True):
+                continue
+
+            # Untyped columns, so values such as integer scripts pass as is
+            columns = sql_table(table, *map(sql_column, rows[0]))
+            if table == "relations":
+                self.session.execute(
+                    sqlite_insert(columns).prefix_with("OR IGNORE"), rows
+                )
+                continue
+
+            stmt = sqlite_insert(columns)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=["id"],
+                set_={key: stmt.excluded[key] for key in rows[0] if key != "id"},
+            )
+            self.session.execute(stmt, rows)
+
+    def _upsert_cards(self, cards: list[Card]):
+        tables = {}
+        for card in cards:
+            for table, row in self._card_rows(card).items():
+                tables.setdefault(table.__tablename__, []).append(row)
+
+        self._upsert_rows(tables)
+
+    def write_cards_to_database(
+        self, cards: Iterable[Card], chunk_size: int = WRITE_CHUNK_SIZE
+    ) -> WriteResult:
+        # Upserts cards chunk by chunk in a single transaction. A failing
+        # chunk is retried card by card so only the offending cards fail.
+        result = WriteResult()
+        cards = iter(cards)
+
+        while chunk := list(islice(cards, chunk_size)):
+            try:
+                with self.session.begin_nested():
+                    self._upsert_cards(chunk)
+                result.written.extend(card.id for card in chunk)
+                continue
+            except (IntegrityError, OperationalError):
+                pass
+
+            for card in chunk:
+                try:
+                    with self.session.begin_nested():
+                        self._upsert_cards([card])
+                    result.written.append(card.id)
+                except (IntegrityError, OperationalError) as e:
+                    result.failed[card.id] = str(e.orig)
+
+        self.session.commit()
+        self._columnar_engine = None
+        for card_id in result.written:
+            self.card_cache.pop(card_id)
+        return result
+
+    def _import_cdb(self, path: str) -> WriteResult:
+        # Copies the card tables of another cdb with ATTACH and INSERT SELECT,
+        # over the columns both databases have.
+        self.session.commit()
+        uri = f"{Path(path).absolute().as_uri()}?mode=ro"
+        connection = self.engine.raw_connection()
+        try:
+            cursor = connection.cursor()
+            cursor.execute("ATTACH DATABASE ? AS source", (uri,))
+            try:
+                tables = {
+                    schema: {
+                        name
+                        for name, in cursor.execute(
+                            f"SELECT name FROM {schema}.sqlite_master "
+                            "WHERE type = 'table'"
+                        )
+                    }
+                    for schema in ["main", "source"]
+                }
+                for table, key in IMPORT_TABLES.items():
+                    if table not in tables["main"] & tables["source"]:
+                        continue
+
+                    source_columns = {
+                        row[1]
+                        for row in cursor.execute(f"PRAGMA source.table_info({table})")
+                    }
+                    columns = ", ".join(
+                        f'"{row[1]}"'
+                        for row in cursor.execute(f"PRAGMA main.table_info({table})")
+                        if row[1] in source_columns
+                    )
+                    cursor.execute(
+                        f"DELETE FROM main.{table} "
+                        f"WHERE {key} IN (SELECT {key} FROM source.{table})"
+                    )
+                    cursor.execute(
+                        f"INSERT INTO main.{table} ({columns}) "
+                        f"SELECT {columns} FROM source.{table}"
+                    )
+
+                written = [id for id, in cursor.execute("SELECT id FROM source.datas")]
+                connection.commit()
+            except Exception:
+                connection.rollback()
+                raise
+            finally:
+                cursor.execute("DETACH DATABASE source")
+        finally:
+            connection.close()
+
+        return WriteResult(written=written)
+
+    def import_cards(
+        self,
+        source: str,
+        format: ImportFormat | None = None,
+        chunk_size: int = IMPORT_CHUNK_SIZE,
+    ) -> WriteResult:
+        # Imports a card dump without building Card objects. JSON, JSON Lines
+        # and CSV dumps hold to_dict shaped records and are decoded chunk by
+        # chunk in one transaction, records with invalid values fail alone.
+        # Any other error rolls the whole import back.
+        format = format or guess_format(source)
+
+        try:
+            if format == "cdb":
+                result = self._import_cdb(source)
+            else:
+                result = WriteResult()
+                records = read_records(source, format)
+                while chunk := list(islice(records, chunk_size)):
+                    tables, failed, skipped = decode_records(chunk)
+                    self._upsert_rows(tables)
+                    result.written.extend(row["id"] for row in tables["datas"])
+                    result.failed |= failed
+                    result.skipped += skipped
+
+            self.session.commit()
+        except Exception:
+            self.session.rollback()
+            raise
+
+        self._columnar_engine = None
+        self._set_cache = None
+        for card_id in result.written:
+            self.card_cache.pop(card_id)
+            self._card_packs.pop(card_id, None)
+        return result
+
+    def export(
+        self,
+        path: str,
+        format: ExportFormat | None = None,
+        fields: Iterable[str] | None = None,
+        chunk_size: int = EXPORT_CHUNK_SIZE,
+        max_workers: int | None = None,
+    ) -> int:
+        # Streams the card pool to a JSON Lines, JSON, CSV or Parquet file.
+        # Raw rows are handed to worker processes that build and serialize
+        # the cards, fields picks and orders the to_dict keys written.
+        rows = (tuple(row) for row in self.card_query.yield_per(chunk_size))
+        return export_cards(
+            rows,
+            path,
+            format or guess_export_format(path),
+            fields,
+            chunk_size,
+            max_workers,
+        )
+
+    def prefetch_scripts(
+        self,
+        cards: Iterable[Card],
+        workers: int = SCRIPT_WORKERS,
+        cache: ScriptCache | None = None,
+    ) -> dict[int, str | None]:
+        # Scripts of many cards at once. Scripts stored in the database are
+        # returned as is, the others are looked up in the script cache and
+        # downloaded concurrently when missing.
+        cache = cache or get_script_cache()
+        scripts = {}
+        remote = {}
+        for card in cards:
+            if card._scriptdata == 1:
+                remote[card.id] = card.alias
+            else:
+                scripts[card.id] = card._scriptdata
+        return scripts | cache.prefetch(remote.items(), workers)
+
+    def export_snapshot(self, path: str, key: str = ""):
+        # Memory-mappable copy of the card pool, see CardSnapshot.open
+        write_snapshot(path, self.iter_cards(), key)
 
     ################# Archetype Functions #################
 
     @property
     def arch_query(self):
-        items = [Setcodes.id, Setcodes.name]
+        items = [Setcodes.id.label("id"), Setcodes.name]
         return self.session.query(*items)
 
-    def _make_arch_list(self, results) -> list[Archetype]:
-        return [self._make_archetype(result) for result in results]
-
-    def _make_archetype(self, result) -> Archetype:
-        if result.id == 0:
-            return Archetype(result.id, result.name)
-
-        def _member_subquery(datas_cols):
+    def _archetype_members_query(self, arch_ids: list[int]):
+        if self.has_archetype_index:
             return (
-                self.session.query(func.group_concat(Datas.id, ",").label("cardids"))
-                .join(Setcodes, or_(*[Setcodes.id == x for x in datas_cols]))
-                .filter(
-                    and_(or_(*[x == result.id for x in datas_cols]), Setcodes.id != 0)
+                self.session.query(
+                    CardArchetypes.archid,
+                    CardArchetypes.role,
+                    func.group_concat(CardArchetypes.cardid, ","),
                 )
+                .filter(CardArchetypes.archid.in_(arch_ids))
+                .group_by(CardArchetypes.archid, CardArchetypes.role)
             )
 
-        members_query = _member_subquery(Datas.archetypes)
-        support_query = _member_subquery(Datas.supportarchs)
-        related_query = _member_subquery(Datas.relatedarchs)
+        # Without the index, decode the setcodes in a single pass over datas
+        return self.session.query(Datas.id, Datas.setcode, Datas.support)
+
+    def _collect_archetype_members(
+        self, results, arch_ids: list[int]
+    ) -> dict[tuple[int, str], str]:
+        # Comma separated card ids per (archetype, role), for all requested
+        # archetypes at once.
+        if self.has_archetype_index:
+            return {(archid, role): cardids for archid, role, cardids in results}
+
+        wanted = set(arch_ids)
+        members: dict[tuple[int, str], list[str]] = {}
+        for card_id, setcode, support in results:
+            for role, archids in [
+                ("member", Card._split_chunks(setcode, 4)),
+                ("support", Card._split_chunks(support, 2)),
+                ("related", Card._split_chunks(support >> 32, 2)),
+            ]:
+                for archid in set(archids) & wanted:
+                    members.setdefault((archid, role), []).append(str(card_id))
+        return {key: ",".join(cardids) for key, cardids in members.items()}
+
+    def _build_arch_list(self, results, members: dict) -> list[Archetype]:
+        return [
+            Archetype(
+                *result,
+                _members_data=members.get((result.id, "member"), ""),
+                _support_data=members.get((result.id, "support"), ""),
+                _related_data=members.get((result.id, "related"), ""),
+            )
+            for result in results
+        ]
 
-        members_results = members_query.one()
-        support_results = support_query.one()
-        related_results = related_query.one()
+    def _make_arch_list(self, results) -> list[Archetype]:
+        results = list(results)
+        # Setcode 0 marks "no archetype" and never has members.
+        arch_ids = [result.id for result in results if result.id != 0]
+        members_results = self._archetype_members_query(arch_ids).all()
+        members = self._collect_archetype_members(members_results, arch_ids)
+        return self._build_arch_list(results, members)
 
-        return Archetype(
-            *result,
-            _members_data=members_results.cardids,
-            _support_data=support_results.cardids,
-            _related_data=related_results.cardids,
-        )
+    def _make_archetype(self, result) -> Archetype:
+        return self._make_arch_list([result])[0]
 
     @property
     def archetypes(self) -> list[Archetype]:
@@ -367,18 +1234,7 @@ class YugiDB:
         return self.get_archetypes_by_values({key: value})
 
     def get_archetypes_by_values(self, params: dict) -> list[Archetype]:
-        params = {k.lower(): v for k, v in params.items()}
-        filters = [
-            self._build_query(params, **filter_param)
-            for filter_param in archetype_filter_params
-        ]
-
-        if not filters:
-            return []
-
-        filters = [filter for filter in filters if filter is not None]
-
-        query = self.arch_query.filter(*filters)
+        query = self._query_by_values("arch_query", archetype_filter_params, params)
         results = query.all()
         return self._make_arch_list(results)
 
@@ -433,26 +1289,58 @@ class YugiDB:
             id = cardorid.id
         elif isinstance(cardorid, int):
             id = cardorid
-        query = self.set_query.filter(Relations.cardid == id)
-        results = query.all()
-        return self._make_set_list(results)
+        return self.get_sets_for_cards([id])[id]
 
-    def get_sets_by_value(self, key: str, value: str):
-        return self.get_sets_by_values({key: value})
+    def _missing_card_packs(self, card_ids: list[int]) -> Iterator[list[int]]:
+        # Chunks of card ids whose pack ids are not cached yet
+        missing = iter({id for id in card_ids if id not in self._card_packs})
+        while chunk := list(islice(missing, ITER_CHUNK_SIZE)):
+            yield chunk
 
-    def get_sets_by_values(self, params: dict) -> list[Set]:
-        params = {k.lower(): v for k, v in params.items()}
-        filters = [
-            self._build_query(params, **filter_param)
-            for filter_param in set_filter_params
-        ]
+    def _card_packs_query(self, card_ids: list[int]):
+        return self.session.query(Relations.cardid, Relations.packid).filter(
+            Relations.cardid.in_(card_ids)
+        )
 
-        if not filters:
-            return []
+    def _cache_card_packs(self, card_ids: list[int], results):
+        for card_id in card_ids:
+            self._card_packs[card_id] = []
+        for card_id, pack_id in results:
+            self._card_packs[card_id].append(pack_id)
+
+    def _collect_card_sets(self, card_ids: list[int]) -> dict[int, list[Set]]:
+        sets = self._set_cache
+        return {
+            card_id: sorted(
+                (
+                    copy(sets[pack_id])
+                    for pack_id in self._card_packs.get(card_id, [])
+                    if pack_id in sets
+                ),
+                key=lambda set: set.name,
+            )
+            for card_id in card_ids
+        }
+
+    def get_sets_for_cards(self, card_ids: Iterable[int]) -> dict[int, list[Set]]:
+        # Pack ids per card are looked up once and cached, sets are shared
+        # between cards and come from a single set_query.
+        card_ids = [int(card_id) for card_id in card_ids]
+        if not self.has_packs:
+            return {card_id: [] for card_id in card_ids}
+
+        for chunk in self._missing_card_packs(card_ids):
+            self._cache_card_packs(chunk, self._card_packs_query(chunk).all())
+
+        if self._set_cache is None:
+            self._set_cache = {set.id: set for set in self.sets}
+        return self._collect_card_sets(card_ids)
 
-        filters = [filter for filter in filters if filter is not None]
+    def get_sets_by_value(self, key: str, value: str):
+        return self.get_sets_by_values({key: value})
 
-        query = self.set_query.filter(*filters)
+    def get_sets_by_values(self, params: dict) -> list[Set]:
+        query = self._query_by_values("set_query", set_filter_params, params)
         results = query.all()
         return self._make_set_list(results)
 
@@ -1,8 +1,177 @@
+import ast
+import asyncio
+import hashlib
+import json
+import os
+import pickle
+import pkgutil
+import shutil
+import sqlite3
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing, contextmanager
+from copy import copy
+from unittest.mock import patch
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from tempfile import TemporaryDirectory
 from unittest import TestCase, main
 
+from sqlalchemy import event, text
+
+import src
+from src.archetype import archetypes_to_records
+from src.asyncyugidb import AsyncYugiDB
+from src.card import CARD_SCHEMA, cards_to_records
+from src.cardtable import CardTable
 from src.deck import Deck
+from src.diff import diff_databases
+from src.exporter import EXPORT_FIELD_TYPES, EXPORT_FIELDS, export_cards
 from src.enums import *
+from src.federateddb import FederatedDB
 from src.omegadb import OmegaDB
+from src.scripts import ScriptCache
+from src.snapshot import SNAPSHOT_HEADER, CardSnapshot
+from src.sqlclasses import Datas
+from src.yugidb import YugiDB
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Card types, levels and link markers the synthetic cards cycle through
+TEST_CARD_KINDS = [
+    (Type.Monster | Type.Effect, 4, 0),
+    (Type.Monster | Type.Normal, 3, 0),
+    (Type.Monster | Type.Effect | Type.Synchro, 8, 0),
+    (Type.Monster | Type.Effect | Type.Link, 2, LinkMarker.Top | LinkMarker.Bottom),
+    (Type.Monster | Type.Effect | Type.Xyz, 4, 0),
+    (Type.Monster | Type.Effect | Type.Pendulum, 5 << 24 | 5 << 16 | 7, 0),
+    (Type.Spell, 0, 0),
+    (Type.Spell | Type.QuickPlay, 0, 0),
+    (Type.Trap, 0, 0),
+    (Type.Trap | Type.Counter, 0, 0),
+]
+TEST_NAMES = ["Dragon", "Magician", "100% Power", "Hero_Clone", "Odd-Eyes"]
+TEST_ARCHETYPES = {0x10: "Alpha", 0x20: "Beta", 0x30: "Gamma"}
+
+
+def make_test_db(path: str, count: int = 600) -> str:
+    """Build a database in the Omega schema with count generated cards.
+
+    Every third card has no koid and every fourth no rarity, cards belong to
+    up to two archetypes and every tenth card is in one of two packs.
+    """
+    with closing(sqlite3.connect(path)) as connection:
+        with open(os.path.join(ROOT, "sql", "omegadb.sql")) as f:
+            connection.executescript(f.read())
+
+        for i in range(count):
+            id = 100000 + 7 * i
+            type, level, linkmarkers = TEST_CARD_KINDS[i % len(TEST_CARD_KINDS)]
+            archetypes = list(TEST_ARCHETYPES)[: i % 3]
+            connection.execute(
+                "INSERT INTO datas VALUES (?, ?, 0, ?, ?, ?, ?, ?, ?, ?, ?, 0, 1, "
+                "?, ?, ?)",
+                (
+                    id,
+                    1 + i % 3,
+                    sum(code << 16 * n for n, code in enumerate(archetypes)),
+                    int(type),
+                    (i * 100) % 3100,
+                    int(linkmarkers) if linkmarkers else (i * 300) % 3100,
+                    level,
+                    1 << i % 25,
+                    1 << i % 7,
+                    int(Category.BetaCard) if i % 11 == 0 else 0,
+                    0x30 << 16 if i % 5 == 0 else 0,
+                    1000000000 + 86400 * i,
+                    1100000000 + 86400 * i,
+                ),
+            )
+            connection.execute(
+                'INSERT INTO texts (id, name, "desc") VALUES (?, ?, ?)',
+                (
+                    id,
+                    f"Test {TEST_NAMES[i % len(TEST_NAMES)]} {i}",
+                    f"Card number {i}, mentions {TEST_NAMES[(i + 1) % 5]}.",
+                ),
+            )
+            if i % 3:
+                connection.execute("INSERT INTO koids VALUES (?, ?)", (id, i))
+            if i % 4:
+                connection.execute(
+                    "INSERT INTO rarities VALUES (?, ?)", (id, 1 << i % 6)
+                )
+            if i % 10 == 0:
+                connection.execute(
+                    "INSERT INTO relations VALUES (?, ?)", (id, 1 + i // 10 % 2)
+                )
+
+        connection.execute("INSERT INTO setcodes VALUES (0, 0, '', 0)")
+        for code, name in TEST_ARCHETYPES.items():
+            connection.execute(
+                "INSERT INTO setcodes VALUES (?, ?, ?, 0)", (code, code, name)
+            )
+        connection.execute("INSERT INTO packs VALUES (1, 'TST1', 'Test Pack', 0, 0)")
+        connection.execute("INSERT INTO packs VALUES (2, 'TST2', 'Other Pack', 0, 0)")
+        connection.commit()
+    return path
+
+
+class FileHandler(BaseHTTPRequestHandler):
+    # Serves server.files by path with ETags, If-None-Match and Range
+    # requests. Integer values are answered with that status code.
+    def do_GET(self):
+        self.server.requests.append((self.path, dict(self.headers)))
+        data = self.server.files.get(self.path.lstrip("/"), 404)
+        if isinstance(data, int):
+            self.send_error(data)
+            return
+
+        etag = f'"{hashlib.sha256(data).hexdigest()[:16]}"'
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.end_headers()
+            return
+
+        status = 200
+        start = 0
+        if "Range" in self.headers and self.headers.get("If-Range", etag) == etag:
+            start = int(self.headers["Range"].removeprefix("bytes=").rstrip("-"))
+            if start >= len(data):
+                self.send_response(416)
+                self.send_header("Content-Range", f"bytes */{len(data)}")
+                self.end_headers()
+                return
+            status = 206
+
+        self.send_response(status)
+        self.send_header("ETag", etag)
+        self.send_header("Content-Length", str(len(data) - start))
+        if status == 206:
+            self.send_header(
+                "Content-Range", f"bytes {start}-{len(data) - 1}/{len(data)}"
+            )
+        self.end_headers()
+        self.wfile.write(data[start:])
+
+    def log_message(self, *args):
+        pass
+
+
+@contextmanager
+def serve_files(files: dict[str, bytes | int]):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FileHandler)
+    server.files = files
+    server.requests = []
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield server, f"http://127.0.0.1:{server.server_port}/"
+    finally:
+        server.shutdown()
+        server.server_close()
 
 
 class TestDB(TestCase):
@@ -164,6 +333,1019 @@ class TestDB(TestCase):
         atkequdef = self.db.get_cards_by_value("atk", "def")
         self.assertIn(meteoragon, atkequdef)
 
+    def test_columnar_search(self):
+        columnar_db = OmegaDB(update="skip", columnar=True)
+        self.addCleanup(columnar_db.close)
+        queries = [
+            {"type": "synchro,pendulum|fusion,pendulum"},
+            {"type": "monster,effect|~token", "atk": ">=2000"},
+            {"race": "~dragon", "category": "~rushcard"},
+            {"mentions": "golden castle of stromberg"},
+            {"type": "trapmonster"},
+            {"atk": "def"},
+            {"koid": "<100"},
+        ]
+        for query in queries:
+            self.assertEqual(
+                [c.id for c in TestDB.db.get_cards_by_values(query)],
+                [c.id for c in columnar_db.get_cards_by_values(query)],
+            )
+
+    def test_paginate(self):
+        query = {"type": "monster,effect"}
+        cards = TestDB.db.get_cards_by_values(query, order_by="-atk")
+        self.assertEqual(TestDB.db.count_cards_by_values(query), len(cards))
+        self.assertEqual(
+            TestDB.db.get_cards_by_values(query, limit=50, offset=50, order_by="-atk"),
+            cards[50:100],
+        )
+        self.assertEqual(
+            TestDB.db.get_cards_by_values(
+                query, limit=50, order_by="-atk", after=cards[49]
+            ),
+            cards[50:100],
+        )
+
+    def test_projection(self):
+        query = {"type": "link"}
+        cards = TestDB.db.get_cards_by_values(
+            query, order_by="name", projection="names"
+        )
+        self.assertTrue(all(len(card.__dict__) <= 3 for card in cards))
+        self.assertEqual(cards, TestDB.db.get_cards_by_values(query, order_by="name"))
+
+        # Pickling loads the deferred fields and leaves the loader behind
+        cards = TestDB.db.get_cards_by_values(query, projection="names")
+        copies = pickle.loads(pickle.dumps(cards))
+        self.assertTrue(all("_loader" not in card.__dict__ for card in copies))
+        self.assertEqual(copies, TestDB.db.get_cards_by_values(query))
+
+    def test_snapshot(self):
+        snapshot = TestDB.db.open_snapshot()
+        query = {"type": "monster,effect|~token", "atk": ">=2000"}
+        self.assertEqual(
+            sorted(c.id for c in TestDB.db.get_cards_by_values(query)),
+            [c.id for c in snapshot.get_cards_by_values(query)],
+        )
+        self.assertEqual(
+            snapshot.get_card_by_id(10497636), TestDB.db.get_card_by_id(10497636)
+        )
+        self.assertEqual(
+            list(snapshot.iter_cards()),
+            sorted(TestDB.db.cards, key=lambda card: card.id),
+        )
+
+        # Partially written snapshots are rebuilt like stale ones. Write them
+        # to a new file, the current one is still mapped.
+        cards = list(snapshot.iter_cards())
+        with open(TestDB.db.snapshotpath, "rb") as f:
+            data = f.read()
+        for size in [0, 16, SNAPSHOT_HEADER.size + 100, len(data) - 1]:
+            path = f"{TestDB.db.snapshotpath}.{size}"
+            with open(path, "wb") as f:
+                f.write(data[:size])
+            self.addCleanup(os.remove, path)
+            self.assertEqual(list(TestDB.db.open_snapshot(path).iter_cards()), cards)
+
+    def test_sets_for_cards(self):
+        card_ids = [10497636, 1861629]
+        sets = TestDB.db.get_sets_for_cards(card_ids)
+        for card_id in card_ids:
+            self.assertEqual(sets[card_id], TestDB.db.get_card_sets(card_id))
+            self.assertTrue(all(card_id in set.contents for set in sets[card_id]))
+
+        # Callers get their own contents, the cached sets stay intact
+        for set in sets[card_ids[0]]:
+            set.contents.clear()
+        for set in TestDB.db.get_card_sets(card_ids[0]):
+            self.assertEqual(set.contents, TestDB.db.get_set_by_id(set.id).contents)
+            self.assertIn(card_ids[0], set.contents)
+
+    def test_federated(self):
+        other = YugiDB(TestDB.db.connection_string, mode="readonly")
+        self.addCleanup(other.close)
+        federated = FederatedDB([TestDB.db, other])
+        query = {"type": "monster,effect", "atk": ">=2500"}
+        self.assertEqual(
+            federated.get_cards_by_values(query),
+            TestDB.db.get_cards_by_values(query),
+        )
+        federated.close()
+
+    def test_diff(self):
+        delta = diff_databases(TestDB.db.dbpath, TestDB.db.dbpath)
+        self.assertEqual(delta.cards, [])
+        self.assertEqual(delta.sets, [])
+
+    def test_import(self):
+        cards = TestDB.db.get_archetype_cards(TestDB.db.get_archetype_by_id(351))
+        with TemporaryDirectory() as tmp:
+            dump = os.path.join(tmp, "cards.jsonl")
+            with open(dump, "w", encoding="utf-8") as f:
+                f.writelines(json.dumps(card.to_dict()) + "\n" for card in cards)
+
+            path = shutil.copy(TestDB.db.dbpath, os.path.join(tmp, "copy.db"))
+            db = YugiDB(f"sqlite:///{path}")
+            result = db.import_cards(dump)
+            self.assertEqual(sorted(result.written), sorted(c.id for c in cards))
+            self.assertEqual(result.failed, {})
+            self.assertEqual(
+                [c.to_dict() for c in db.get_cards_by_ids(result.written)],
+                [c.to_dict() for c in sorted(cards, key=lambda c: c.id)],
+            )
+            db.close()
+
+    def test_enum_decode(self):
+        card = TestDB.db.get_card_by_id(10497636)
+        card.type.append(Type.Tuner)
+        self.assertEqual(card.type, [Type.Monster, Type.Effect])
+        card.append_type(Type.Tuner)
+        self.assertIn(Type.Tuner, card.type)
+        self.assertEqual(
+            TestDB.db.get_card_by_id(10497636).type, [Type.Monster, Type.Effect]
+        )
+
+    def test_import_time(self):
+        # Fresh interpreter, importing the package and the deck and card
+        # classes must not load the database or rendering dependencies
+        script = (
+            "import sys, time\n"
+            "start = time.perf_counter()\n"
+            "from src import Card, Deck, Type\n"
+            "print(time.perf_counter() - start)\n"
+            "print(*sorted(sys.modules))\n"
+        )
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        output = subprocess.run(
+            [sys.executable, "-c", script], cwd=root, capture_output=True, text=True
+        ).stdout.splitlines()
+        seconds, modules = float(output[0]), output[1].split()
+        for heavy in ["sqlalchemy", "numpy", "PIL", "requests", "fake_useragent"]:
+            self.assertNotIn(heavy, modules, f"import took {seconds * 1000:.0f} ms")
+
+        # Star imports load every submodule, but still not the user agent
+        script = (
+            "import sys\n"
+            "from src import *\n"
+            "print('fake_useragent' in sys.modules)\n"
+            "from src import ua\n"
+            "print('fake_useragent' in sys.modules)\n"
+        )
+        output = subprocess.run(
+            [sys.executable, "-c", script], cwd=root, capture_output=True, text=True
+        ).stdout.split()
+        self.assertEqual(output, ["False", "True"])
+
+    def test_exports(self):
+        # Every public top-level name of a submodule is exported by the
+        # package, util only holds helpers for the other submodules
+        for module in pkgutil.iter_modules(src.__path__):
+            if module.name == "util":
+                continue
+            path = os.path.join(os.path.dirname(src.__file__), f"{module.name}.py")
+            with open(path, encoding="utf-8") as f:
+                tree = ast.parse(f.read())
+
+            names = set()
+            for node in tree.body:
+                if isinstance(node, (ast.FunctionDef, ast.ClassDef)):
+                    names.add(node.name)
+                elif isinstance(node, (ast.Assign, ast.AnnAssign)):
+                    targets = getattr(node, "targets", None) or [node.target]
+                    names.update(
+                        name.id
+                        for target in targets
+                        for name in ast.walk(target)
+                        if isinstance(name, ast.Name)
+                    )
+            public = {name for name in names if not name.startswith("_")}
+            self.assertEqual(public - {"logger"} - set(dir(src)), set(), module.name)
+
+    def test_scripts(self):
+        cards = TestDB.db.get_cards_by_values({"type": "monster"})
+        with TemporaryDirectory() as tmp:
+            mirror = os.path.join(tmp, "mirror")
+            os.mkdir(mirror)
+            for card in cards[1:]:
+                with open(os.path.join(mirror, f"c{card.id}.lua"), "w") as f:
+                    f.write(f"-- {card.name}")
+
+            for card in cards:
+                card._scriptdata = 1
+            cache = ScriptCache(os.path.join(tmp, "cache"), None, mirror)
+            scripts = TestDB.db.prefetch_scripts(cards, workers=4, cache=cache)
+        self.assertIsNone(scripts[cards[0].id])
+        self.assertEqual(scripts[cards[1].id], f"-- {cards[1].name}")
+
+    def test_records(self):
+        cards = TestDB.db.get_cards_by_values({"type": "monster"})
+        self.assertEqual(cards_to_records(cards), [c.to_dict() for c in cards])
+        self.assertEqual(
+            json.loads(cards_to_records(cards, ["id", "race"], as_json=True)),
+            [{"id": c.id, "race": c.race.name} for c in cards],
+        )
+        archetypes = TestDB.db.archetypes
+        self.assertEqual(
+            archetypes_to_records(archetypes), [a.to_dict() for a in archetypes]
+        )
+        with self.assertRaises(ValueError):
+            cards_to_records(cards, ["bogus"])
+
+    def test_card_table(self):
+        cards = TestDB.db.get_cards_by_values({"type": "monster"})
+        table = CardTable.from_cards(cards)
+        self.assertEqual(list(table), cards)
+        self.assertEqual(table.get_card_by_id(cards[-1].id), cards[-1])
+        self.assertIsNone(table.get_card_by_id(0))
+        self.assertFalse(hasattr(cards[0], "__dict__"))
+
+    def test_card_table_masks(self):
+        table = TestDB.db.card_table
+        cards = list(table)
+        mask = table.is_extradeck & ~table.has_linkmarker(LinkMarker.Top)
+        self.assertEqual(
+            mask.tolist(),
+            [c.is_extradeck and not c.has_linkmarker(LinkMarker.Top) for c in cards],
+        )
+        self.assertEqual(table.level.tolist(), [c.level for c in cards])
+        self.assertEqual(table.def_.tolist(), [c.def_ for c in cards])
+        self.assertEqual(
+            table.cards_where(table.is_spelltrap), [c for c in cards if c.is_spelltrap]
+        )
+
+    def test_export(self):
+        with TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "cards.jsonl")
+            count = TestDB.db.export(path, fields=["id", "name", "type"])
+            with open(path, encoding="utf-8") as f:
+                records = [json.loads(line) for line in f]
+        self.assertEqual(count, len(records))
+        card = TestDB.db.get_card_by_id(10497636)
+        self.assertIn(
+            {"id": card.id, "name": card.name, "type": card.to_dict()["type"]},
+            records,
+        )
+
+
+class TestSyntheticDB(TestCase):
+    # Behavior tests against generated databases instead of the Omega DB
+    maxDiff = None
+
+    def setUp(self):
+        self.tmp = TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    def path(self, name: str) -> str:
+        return os.path.join(self.tmp.name, name)
+
+    def open(self, path: str, **kwargs) -> YugiDB:
+        db = YugiDB(f"sqlite:///{path}", **kwargs)
+        self.addCleanup(db.close)
+        return db
+
+    def test_download(self):
+        def etag(data: bytes) -> str:
+            return f'"{hashlib.sha256(data).hexdigest()[:16]}"'
+
+        def omega(base_url: str) -> OmegaDB:
+            db = OmegaDB(update="auto", base_url=base_url)
+            self.addCleanup(db.close)
+            return db
+
+        versions = []
+        for count in [100, 150, 200]:
+            with open(make_test_db(self.path(f"v{count}.db"), count), "rb") as f:
+                versions.append(f.read())
+
+        cwd = os.getcwd()
+        os.chdir(self.tmp.name)
+        self.addCleanup(os.chdir, cwd)
+
+        files = {"OmegaDB.cdb": versions[0], "Database.hash": b"v1"}
+        with serve_files(files) as (server, url):
+            self.assertEqual(len(omega(url).cards), 100)
+
+            # Resume an interrupted download of the next version
+            files |= {"OmegaDB.cdb": versions[1], "Database.hash": b"v2"}
+            with open("db/omega/omega.db.part", "wb") as f:
+                f.write(versions[1][:4096])
+            with open("db/omega/omega.json", "w") as f:
+                json.dump({"partial": etag(versions[1])}, f)
+            server.requests.clear()
+            db = omega(url)
+            self.assertEqual(len(db.cards), 150)
+            self.assertEqual(db.hash, "v2")
+            self.assertEqual(server.requests[-1][1]["Range"], "bytes=4096-")
+
+            # A complete partial file gets 416 and is downloaded again
+            files |= {"OmegaDB.cdb": versions[2], "Database.hash": b"v3"}
+            with open("db/omega/omega.db.part", "wb") as f:
+                f.write(versions[2])
+            with open("db/omega/omega.json", "w") as f:
+                json.dump({"partial": etag(versions[2])}, f)
+            db = omega(url)
+            self.assertEqual(len(db.cards), 200)
+            self.assertEqual(db.hash, "v3")
+            self.assertFalse(os.path.exists("db/omega/omega.db.part"))
+
+            # Not modified, the hash is only stored with a new database
+            files["Database.hash"] = b"v4"
+            db = omega(url)
+            self.assertEqual(server.requests[-1][1]["If-None-Match"], etag(versions[2]))
+            self.assertEqual(db.hash, "v3")
+
+            # Failed downloads keep the current database
+            files["OmegaDB.cdb"] = 500
+            db = omega(url)
+            self.assertEqual(len(db.cards), 200)
+            self.assertEqual(db.hash, "v3")
+
+    def test_diff(self):
+        def custom_db(path: str, cards: list[tuple], setcodes: list[tuple]):
+            with closing(sqlite3.connect(path)) as connection:
+                with open(os.path.join(ROOT, "sql", "customdb.sql")) as f:
+                    connection.executescript(f.read())
+                for id, setcode, atk in cards:
+                    connection.execute(
+                        "INSERT INTO datas (id, setcode, atk) VALUES (?, ?, ?)",
+                        (id, setcode, atk),
+                    )
+                    connection.execute(
+                        'INSERT INTO texts (id, name, "desc") VALUES (?, ?, "")',
+                        (id, f"Card {id}"),
+                    )
+                connection.executemany(
+                    "INSERT INTO setcodes VALUES (?, ?, ?, 0)", setcodes
+                )
+                connection.commit()
+            return path
+
+        old = custom_db(
+            self.path("old.cdb"),
+            [(1, 20, 1000), (2, 0, 1500), (3, None, 500)],
+            [(10, 10, "Alpha"), (None, 20, "Beta only"), (None, None, "Unset")],
+        )
+        new = custom_db(
+            self.path("new.cdb"),
+            [(1, 20, 1000), (2, 0, 1800), (4, 30, 0)],
+            [
+                (10, 10, "Alpha Renamed"),
+                (None, 20, "Beta only"),
+                (None, None, "Unset"),
+                (30, 30, "Gamma"),
+            ],
+        )
+
+        delta = diff_databases(old, new)
+        self.assertEqual(delta.added, [4])
+        self.assertEqual(delta.removed, [3])
+        self.assertEqual(delta.changed, [2])
+        self.assertEqual(delta.archetypes, [10, 30])
+        self.assertEqual(delta.sets, [])
+        self.assertEqual(diff_databases(new, new).archetypes, [])
+
+        # A reprint only adds a relations row, cached copies of the card still
+        # have to go
+        old = make_test_db(self.path("old.db"), 50)
+        new = make_test_db(self.path("new.db"), 50)
+        with closing(sqlite3.connect(new)) as connection:
+            connection.execute("INSERT INTO relations VALUES (100007, 2)")
+            connection.commit()
+        delta = diff_databases(old, new)
+        self.assertEqual(
+            (delta.cards, delta.sets, delta.archetypes), ([100007], [2], [])
+        )
+
+        db = self.open(old)
+        self.assertEqual(db.get_card_by_id(100007).sets, [])
+        db.close()
+        shutil.copy(new, old)
+        db.refresh(delta)
+        self.assertEqual(db.get_card_by_id(100007).sets, [2])
+
+    def test_snapshot(self):
+        db = self.open(make_test_db(self.path("cards.db")))
+        db.export_snapshot(self.path("cards.snapshot"), "key")
+        snapshot = CardSnapshot.open(self.path("cards.snapshot"), "key")
+        cards = sorted(db.cards, key=lambda card: card.id)
+        self.assertTrue(any(card._raritydata is None for card in cards))
+        self.assertEqual(list(snapshot.iter_cards()), cards)
+        self.assertEqual(snapshot.get_cards_by_ids(c.id for c in cards), cards)
+
+        with open(self.path("cards.snapshot"), "rb") as f:
+            data = f.read()
+        for size in [16, SNAPSHOT_HEADER.size + 100, len(data) - 1]:
+            with open(self.path("truncated.snapshot"), "wb") as f:
+                f.write(data[:size])
+            with self.assertRaisesRegex(ValueError, "Truncated"):
+                CardSnapshot.open(self.path("truncated.snapshot"))
+
+    def test_federated(self):
+        first = self.open(make_test_db(self.path("first.db"), 300))
+        second = self.open(make_test_db(self.path("second.db")))
+        # Cards both databases have sort first in the second one, but the
+        # first database wins them
+        second.session.execute(text("UPDATE datas SET atk = 5000 WHERE id < 102100"))
+        second.session.commit()
+        federated = FederatedDB([first, second], max_workers=8)
+        self.addCleanup(federated.close)
+
+        ids = {card.id for card in first.cards}
+        cards = first.cards + [card for card in second.cards if card.id not in ids]
+        cards.sort(key=lambda card: (-card.atk, card.id))
+        query = {"type": "monster"}
+        monsters = [card for card in cards if card.has_type(Type.Monster)]
+        self.assertEqual(
+            federated.get_cards_by_values(query, limit=50, offset=20, order_by="-atk"),
+            monsters[20:70],
+        )
+        self.assertEqual(
+            federated.get_cards_by_values(query, order_by="-atk"), monsters
+        )
+        self.assertEqual(
+            federated.get_cards_by_values({}, limit=10),
+            sorted(cards, key=lambda c: c.id)[:10],
+        )
+
+        # Concurrent callers never use a member session at the same time
+        calls = {"active": 0, "most": 0}
+        get_cards_by_values = first.get_cards_by_values
+
+        def tracked(*args, **kwargs):
+            calls["active"] += 1
+            calls["most"] = max(calls["most"], calls["active"])
+            try:
+                time.sleep(0.002)
+                return get_cards_by_values(*args, **kwargs)
+            finally:
+                calls["active"] -= 1
+
+        queries = [
+            {"type": "monster", "atk": f">={atk}"} for atk in range(0, 3000, 200)
+        ]
+        expected = [federated.get_cards_by_values(query) for query in queries]
+        first.get_cards_by_values = tracked
+        with ThreadPoolExecutor(8) as executor:
+            results = executor.map(federated.get_cards_by_values, queries)
+            self.assertEqual(list(results), expected)
+        self.assertEqual(calls["most"], 1)
+
+    def test_scripts(self):
+        files = {"c1.lua": b"-- one", "c3.lua": 500, "c5.lua": b"-- five"}
+        cards = [(1, 0), (2, 0), (3, 0), (4, 5)]
+        cache_dir = self.path("scripts")
+        with serve_files(files) as (server, url):
+            scripts = ScriptCache(cache_dir, url).prefetch(cards, workers=4)
+            self.assertEqual(scripts, {1: "-- one", 2: None, 3: None, 4: "-- five"})
+
+            # Cached scripts and 404s are not requested again, errors are
+            server.requests.clear()
+            cache = ScriptCache(cache_dir, url)
+            self.assertEqual(cache.prefetch(cards), scripts)
+            self.assertEqual([path for path, _ in server.requests], ["/c3.lua"])
+
+            # Stale entries are revalidated and answered with 304
+            server.requests.clear()
+            self.assertEqual(ScriptCache(cache_dir, url, max_age=0).get(1), "-- one")
+            self.assertIn("If-None-Match", server.requests[0][1])
+
+        # Connection errors fall back to the cache instead of raising
+        cache = ScriptCache(cache_dir, url, max_age=0)
+        self.assertEqual(cache.prefetch(cards), scripts)
+        with open(os.path.join(cache_dir, "index.json")) as f:
+            self.assertEqual(sorted(json.load(f)), ["1", "2", "4", "5"])
+
+    def test_text_index(self):
+        path = make_test_db(self.path("cards.db"))
+        plain = self.open(shutil.copy(path, self.path("plain.db")), mode="readonly")
+        db = self.open(path)
+        self.assertTrue(db.has_text_index)
+        self.assertFalse(plain.has_text_index)
+
+        def ids(cards):
+            return sorted(card.id for card in cards)
+
+        for phrase in ["dragon", "Dr", "e", "%", "100%", "hero_", "number 12", "zzz"]:
+            self.assertEqual(
+                ids(db.search_cards(phrase)), ids(plain.search_cards(phrase)), phrase
+            )
+            for key in ["in_name", "mentions"]:
+                self.assertEqual(
+                    ids(db.get_cards_by_value(key, phrase)),
+                    ids(plain.get_cards_by_value(key, phrase)),
+                    (key, phrase),
+                )
+
+        # Every write to texts reaches the index
+        card = db.get_card_by_id(100007)
+        card.name = "Renamed Wyvern"
+        self.assertEqual(db.write_cards_to_database([card]).written, [100007])
+        self.assertEqual(ids(db.search_cards("wyvern")), [100007])
+        self.assertNotIn(100007, ids(db.search_cards("Test Magician 1")))
+
+        db.session.execute(
+            text("UPDATE texts SET name = 'Raw Basilisk' WHERE id = 100014")
+        )
+        db.session.execute(
+            text(
+                'INSERT INTO texts (id, name, "desc") '
+                "VALUES (1, 'Inserted Basilisk', '')"
+            )
+        )
+        db.session.execute(text("INSERT INTO datas (id) VALUES (1)"))
+        db.session.execute(text("DELETE FROM texts WHERE id = 100007"))
+        db.session.commit()
+        self.assertEqual(ids(db.search_cards("basilisk")), [1, 100014])
+        self.assertEqual(db.search_cards("wyvern"), [])
+        self.assertEqual(ids(db.get_cards_by_value("in_name", "basilisk")), [1, 100014])
+
+    def test_columnar(self):
+        path = make_test_db(self.path("cards.db"))
+        db = self.open(path, mode="readonly")
+        columnar_db = self.open(path, columnar=True, mode="readonly")
+        db.export_snapshot(self.path("cards.snapshot"), "key")
+        snapshot = CardSnapshot.open(self.path("cards.snapshot"), "key")
+        self.assertEqual(columnar_db.columnar_engine.name.dtype, object)
+
+        # LIKE wildcards and case folding match SQLite
+        phrases = ["%", "_", "100%", "hero_", "DRAGON", "dr%on", "s_n", "zzz"]
+        for phrase in phrases:
+            for key in ["in_name", "mentions"]:
+                expected = db.get_cards_by_values({key: phrase}, order_by="name")
+                for engine in [columnar_db, snapshot]:
+                    self.assertEqual(
+                        engine.get_cards_by_values({key: phrase}, order_by="name"),
+                        expected,
+                        (key, phrase),
+                    )
+        self.assertEqual(len(columnar_db.get_cards_by_value("in_name", "%")), 600)
+
+    def test_export(self):
+        db = self.open(make_test_db(self.path("cards.db")))
+        self.assertEqual(EXPORT_FIELDS, [key for key, _ in CARD_SCHEMA])
+        self.assertEqual(list(EXPORT_FIELD_TYPES), EXPORT_FIELDS)
+
+        path = self.path("cards.jsonl")
+        self.assertEqual(db.export(path, chunk_size=100, max_workers=1), 600)
+        with open(path, encoding="utf-8") as f:
+            records = [json.loads(line) for line in f]
+        self.assertEqual(records, cards_to_records(db.cards))
+
+        # A failed export keeps the previous file and leaves no temporary one
+        def rows():
+            yield from db.card_query.limit(150)
+            raise RuntimeError("Connection lost")
+
+        with self.assertRaises(RuntimeError):
+            export_cards(rows(), path, "json", chunk_size=100, max_workers=1)
+        self.assertEqual(sorted(os.listdir(self.tmp.name)), ["cards.db", "cards.jsonl"])
+
+    def test_import(self):
+        db = self.open(make_test_db(self.path("cards.db")))
+        cards = db.get_cards_by_values({"type": "monster"}, limit=50)
+        records = [card.to_dict() for card in cards]
+        for record in records:
+            record["name"] = f"Imported {record['id']}"
+
+        # Dates are read as UTC whatever the local timezone is
+        timezone = os.environ.get("TZ")
+        os.environ["TZ"] = "America/New_York"
+        time.tzset()
+        try:
+            records[0]["tcgdatestr"] = "02/01/2003"
+            path = self.path("cards.jsonl")
+            with open(path, "w", encoding="utf-8") as f:
+                for record in records + [{"name": "No id"}, {"id": None}]:
+                    f.write(json.dumps(record) + "\n")
+            result = db.import_cards(path, chunk_size=20)
+        finally:
+            if timezone is None:
+                del os.environ["TZ"]
+            else:
+                os.environ["TZ"] = timezone
+            time.tzset()
+
+        self.assertEqual(result.written, [card.id for card in cards])
+        self.assertEqual((result.failed, result.skipped), ({}, 2))
+        self.assertEqual(db.get_card_by_id(cards[0].id)._tcgdatedata, 1041465600)
+        self.assertEqual(db.get_card_by_id(cards[1].id).name, f"Imported {cards[1].id}")
+
+        # An error partway through rolls back the chunks already written
+        with open(path, "w", encoding="utf-8") as f:
+            for record in records[1:30]:
+                f.write(json.dumps(dict(record, name="Rolled back")) + "\n")
+            f.write("{not json\n")
+        with self.assertRaises(ValueError):
+            db.import_cards(path, chunk_size=10)
+        self.assertEqual(db.get_card_by_id(cards[1].id).name, f"Imported {cards[1].id}")
+        self.assertEqual(db.get_cards_by_value("in_name", "rolled back"), [])
+
+        # Empty rarities and sets leave no rows behind, missing dates take
+        # the column default
+        records = [
+            card.to_dict() for card in db.get_cards_by_ids([100000, 100014, 100070])
+        ]
+        records[1]["tcgrarity"] = []
+        records[2]["sets"] = []
+        del records[2]["tcgdatestr"]
+        with open(path, "w", encoding="utf-8") as f:
+            f.writelines(json.dumps(record) + "\n" for record in records)
+        self.assertEqual(db.import_cards(path).written, [100000, 100014, 100070])
+
+        rows = db.session.execute(
+            text(
+                "SELECT 'rarity', id FROM rarities WHERE id IN (100000, 100014, 100070) "
+                "UNION ALL SELECT 'set', cardid FROM relations "
+                "WHERE cardid IN (100000, 100014, 100070)"
+            )
+        )
+        self.assertEqual(sorted(rows), [("rarity", 100070), ("set", 100000)])
+        card = db.get_card_by_id(100070)
+        self.assertEqual(card._tcgdatedata, Datas.tcgdate.default.arg)
+        self.assertEqual(db.get_card_by_id(100000).to_dict(), records[0])
+
+    def test_write(self):
+        path = make_test_db(self.path("cards.db"))
+        db = self.open(path)
+
+        def by_id(cards):
+            return sorted(cards, key=lambda card: card.id)
+
+        # Existing cards take the ON CONFLICT path, including cleared koids
+        # and rarities, a new card is inserted
+        cards = db.get_cards_by_values({}, limit=40)
+        for card in cards:
+            card.name = f"Written {card.id}"
+        cards[4]._koiddata = None
+        cards[5]._raritydata = None
+        new = copy(cards[1])
+        new.id, new.name = 900001, "New card"
+        bad = copy(cards[2])
+        bad.id, bad.name = 900002, None
+
+        # The bad card fails alone, the rest of its chunk is still written
+        result = db.write_cards_to_database(cards + [bad, new], chunk_size=16)
+        self.assertEqual(result.written, [card.id for card in cards] + [900001])
+        self.assertEqual(list(result.failed), [900002])
+        self.assertIn("NOT NULL", result.failed[900002])
+        self.assertEqual(db.count_cards_by_values({}), 601)
+
+        reader = self.open(path, mode="readonly")
+        self.assertEqual(
+            by_id(reader.get_cards_by_ids(result.written)), by_id(cards + [new])
+        )
+        self.assertIsNone(reader.get_card_by_id(cards[4].id)._koiddata)
+        self.assertIsNone(reader.get_card_by_id(cards[5].id)._raritydata)
+
+        # Single writes handle missing koids too and log instead of printing
+        card = db.get_card_by_id(100000)
+        self.assertIsNone(card._koiddata)
+        card.name = "Single write"
+        with self.assertLogs("src.yugidb", "DEBUG"):
+            db.write_card_to_database(card)
+        self.assertEqual(db.get_card_by_id(100000).name, "Single write")
+
+    def test_async(self):
+        path = make_test_db(self.path("cards.db"))
+        db = self.open(path, mode="readonly")
+        ids = [100007, 100070, 100140, 999999]
+        query = {"type": "monster", "atk": ">=1500"}
+        arch = db.get_archetype_by_name("Beta")
+
+        async def run():
+            async_db = AsyncYugiDB(f"sqlite:///{path}", mode="readonly", pool_size=4)
+            try:
+                # Independent lookups share the pool and run concurrently
+                return await asyncio.gather(
+                    async_db.cards(),
+                    async_db.get_cards_by_values(query, limit=20, order_by="-atk"),
+                    async_db.count_cards_by_values(query),
+                    async_db.search_cards("dragon"),
+                    async_db.get_card_by_id(100007),
+                    async_db.get_cards_by_ids(ids),
+                    async_db.get_card_by_name("Test Magician 1"),
+                    async_db.get_archetype_cards(arch),
+                    async_db.get_sets_for_cards(ids),
+                )
+            finally:
+                await async_db.close()
+
+        self.assertEqual(
+            asyncio.run(run()),
+            [
+                db.cards,
+                db.get_cards_by_values(query, limit=20, order_by="-atk"),
+                db.count_cards_by_values(query),
+                db.search_cards("dragon"),
+                db.get_card_by_id(100007),
+                db.get_cards_by_ids(ids),
+                db.get_card_by_name("Test Magician 1"),
+                db.get_archetype_cards(arch),
+                db.get_sets_for_cards(ids),
+            ],
+        )
+
+    def test_query_plans(self):
+        path = make_test_db(self.path("cards.db"))
+        db = self.open(path, mode="readonly")
+        uncached = self.open(path, mode="readonly")
+
+        def expected(query: dict) -> list:
+            uncached._query_plans.clear()
+            return uncached.get_cards_by_values(query)
+
+        # Queries of one shape share a plan, their values are bound per call
+        queries = [
+            {"atk": ">=1000", "in_name": "dragon"},
+            {"atk": ">=2500", "in_name": "magician"},
+            {"atk": ">=0", "in_name": "%"},
+        ]
+        for query in queries:
+            self.assertEqual(db.get_cards_by_values(query), expected(query))
+        self.assertEqual(len(db._query_plans), 1)
+        statement = str(next(iter(db._query_plans.values())).statement)
+        self.assertNotIn("2500", statement)
+        self.assertNotIn("magician", statement)
+
+        # Other shapes get their own plan, the oldest one is evicted first
+        with patch("src.yugidb.QUERY_PLAN_CACHE_SIZE", 2):
+            for query in [{"atk": ">=1000|<100"}, {"type": "spell"}]:
+                self.assertEqual(db.get_cards_by_values(query), expected(query))
+        self.assertEqual(
+            [dict(key[2:]) for key in db._query_plans],
+            [
+                {"atk": (((False, ">=", None),), ((False, "<", None),))},
+                {"type": (((False, "==", "spell"),),)},
+            ],
+        )
+
+    def test_archetype_index(self):
+        path = make_test_db(self.path("cards.db"))
+        plain = self.open(shutil.copy(path, self.path("plain.db")), mode="readonly")
+        db = self.open(path)
+        self.assertTrue(db.has_archetype_index)
+        self.assertFalse(plain.has_archetype_index)
+
+        def members(yugidb: YugiDB) -> dict[int, list[int]]:
+            return {
+                arch.id: [card.id for card in yugidb.get_archetype_cards(arch)]
+                for arch in yugidb.archetypes
+                if arch.id
+            }
+
+        # The index answers like the setcode expressions it replaces
+        cards = db.cards
+        expected = {
+            arch_id: [card.id for card in cards if arch_id in card.archetypes]
+            for arch_id in TEST_ARCHETYPES
+        }
+        self.assertEqual(members(db), expected)
+        self.assertEqual(members(plain), expected)
+
+        # Writes keep it in sync
+        card = db.get_card_by_id(100000)
+        card._archcode = 0x30
+        db.write_card_to_database(card)
+        card = db.get_card_by_id(100007)
+        card._archcode = 0x20 << 16 | 0x30
+        db.write_cards_to_database([card])
+        expected[0x30] = sorted(expected[0x30] + [100000, 100007])
+        expected[0x20] = sorted(expected[0x20] + [100007])
+        expected[0x10].remove(100007)
+        self.assertEqual(members(db), expected)
+
+        def expected_roles(yugidb: YugiDB) -> dict[int, tuple[list, list]]:
+            cards = yugidb.cards
+            return {
+                arch_id: (
+                    [card.id for card in cards if arch_id in card.archetypes],
+                    [card.id for card in cards if arch_id in card.support],
+                )
+                for arch_id in TEST_ARCHETYPES
+            }
+
+        def roles(yugidb: YugiDB) -> dict[int, tuple[list, list]]:
+            return {
+                arch.id: (sorted(arch.members), sorted(arch.support))
+                for arch in yugidb.archetypes
+                if arch.id
+            }
+
+        # Writes from other connections reach the index through triggers
+        with closing(sqlite3.connect(path)) as connection:
+            connection.executescript(
+                "UPDATE datas SET setcode = 0 WHERE id = 100000;"
+                "UPDATE datas SET support = 32 WHERE id = 100014;"
+                "INSERT INTO datas (id, setcode) VALUES (1, 16);"
+                "INSERT INTO texts (id, name) VALUES (1, 'Inserted');"
+                "INSERT OR REPLACE INTO datas (id, setcode) VALUES (100028, 48);"
+                "DELETE FROM datas WHERE id = 100035;"
+            )
+        expected = expected_roles(db)
+        self.assertIn(1, expected[0x10][0])
+        self.assertIn(100028, expected[0x30][0])
+        self.assertEqual(roles(db), expected)
+        self.assertEqual(
+            members(db), {arch_id: ids for arch_id, (ids, _) in expected.items()}
+        )
+
+        # An index without its triggers may be stale and is rebuilt on open
+        with closing(sqlite3.connect(path)) as connection:
+            connection.executescript(
+                "DROP TRIGGER card_archetypes_update;"
+                "UPDATE datas SET setcode = 32 WHERE id = 100042;"
+            )
+        reopened = self.open(path)
+        self.assertTrue(reopened.has_archetype_index)
+        self.assertEqual(roles(reopened), expected_roles(reopened))
+        self.assertIn(100042, reopened.get_archetype_by_id(0x20).members)
+
+    def test_archetype_hydration(self):
+        path = make_test_db(self.path("cards.db"))
+        plain = self.open(shutil.copy(path, self.path("plain.db")), mode="readonly")
+        db = self.open(path)
+
+        cards = db.cards
+        expected = {
+            arch_id: (
+                name,
+                [card.id for card in cards if arch_id in card.archetypes],
+                [card.id for card in cards if arch_id in card.support],
+                [card.id for card in cards if arch_id in card.related],
+            )
+            for arch_id, name in TEST_ARCHETYPES.items()
+        }
+        self.assertTrue(any(support for _, _, support, _ in expected.values()))
+
+        statements = []
+
+        def listener(connection, cursor, statement, *args):
+            statements.append(statement)
+
+        for yugidb in [db, plain]:
+            statements.clear()
+            event.listen(yugidb.engine, "before_cursor_execute", listener)
+            try:
+                archetypes = yugidb.archetypes
+            finally:
+                event.remove(yugidb.engine, "before_cursor_execute", listener)
+
+            # Members of every archetype come from a single query
+            self.assertEqual(len(statements), 2)
+            self.assertEqual(
+                {
+                    arch.id: (
+                        arch.name,
+                        sorted(arch.members),
+                        sorted(arch.support),
+                        sorted(arch.related),
+                    )
+                    for arch in archetypes
+                    if arch.id
+                },
+                expected,
+            )
+
+    def test_iter_cards(self):
+        path = make_test_db(self.path("cards.db"))
+        db = self.open(path, mode="readonly")
+        columnar_db = self.open(path, columnar=True, mode="readonly")
+
+        self.assertEqual(list(db.iter_cards(chunk_size=64)), db.cards)
+
+        # Cards are built one at a time as the iterator is consumed
+        made = []
+        make_card = db._make_card
+
+        def counted(*args):
+            made.append(args)
+            return make_card(*args)
+
+        with patch.object(db, "_make_card", counted):
+            cards = db.iter_cards(chunk_size=64)
+            self.assertEqual(made, [])
+            self.assertEqual(next(cards).id, 100000)
+            self.assertEqual(len(made), 1)
+
+        queries = [{}, {"type": "monster", "atk": ">=1500"}, {"in_name": "hero_"}]
+        for query in queries:
+            expected = db.get_cards_by_values(query)
+            self.assertEqual(
+                list(db.iter_cards_by_values(query, chunk_size=7)), expected
+            )
+            self.assertEqual(list(columnar_db.iter_cards_by_values(query)), expected)
+            self.assertEqual(
+                list(db.iter_cards_by_values(query, projection="stats")),
+                db.get_cards_by_values(query, projection="stats"),
+            )
+
+    def test_open_modes(self):
+        path = make_test_db(self.path("cards.db"))
+        indexed = self.open(
+            shutil.copy(path, self.path("indexed.db")), mode="readwrite"
+        )
+        with open(path, "rb") as f:
+            original = f.read()
+
+        queries = [{"type": "monster", "atk": ">=2000"}, {"in_name": "dragon"}]
+        arch = indexed.get_archetype_by_id(0x20)
+        for mode in ["readonly", "immutable", "memory"]:
+            db = self.open(path, mode=mode)
+
+            # Derived tables can only be built on the in-memory copy, the
+            # other modes fall back to the base tables. All of them are read
+            # only once open.
+            built = mode == "memory"
+            self.assertEqual((db.has_archetype_index, db.has_text_index), (built,) * 2)
+            query_only = db.session.execute(text("PRAGMA query_only")).scalar()
+            self.assertEqual(query_only, 1, mode)
+
+            for query in queries:
+                self.assertEqual(
+                    db.get_cards_by_values(query), indexed.get_cards_by_values(query)
+                )
+            self.assertEqual(
+                db.get_archetype_cards(arch), indexed.get_archetype_cards(arch)
+            )
+            # Only the text index ranks search results
+            self.assertCountEqual(
+                db.search_cards("magician"), indexed.search_cards("magician")
+            )
+
+            card = db.get_card_by_id(100007)
+            card.name = "Written"
+            result = db.write_cards_to_database([card])
+            self.assertEqual((result.written, list(result.failed)), ([], [100007]))
+            with open(path, "rb") as f:
+                self.assertEqual(f.read(), original, mode)
+
+        # A disposed engine copies the file again, the new copy is rebuilt
+        # and read only as well
+        db.close()
+        db.refresh()
+        self.assertEqual((db.has_archetype_index, db.has_text_index), (True, True))
+        self.assertEqual(db.session.execute(text("PRAGMA query_only")).scalar(), 1)
+        self.assertEqual(
+            db.get_archetype_cards(arch), indexed.get_archetype_cards(arch)
+        )
+        result = db.write_cards_to_database([card])
+        self.assertEqual((result.written, list(result.failed)), ([], [100007]))
+
+        with self.assertRaises(ValueError):
+            YugiDB(f"sqlite:///{path}", mode="append")
+
+    def test_card_cache(self):
+        db = self.open(make_test_db(self.path("cards.db")), card_cache_size=4)
+        statements = []
+
+        def listener(connection, cursor, statement, *args):
+            statements.append(statement)
+
+        event.listen(db.engine, "before_cursor_execute", listener)
+        self.addCleanup(event.remove, db.engine, "before_cursor_execute", listener)
+
+        # Hits are served without a query, as copies of the cached card
+        card = db.get_card_by_id(100000)
+        card.name = "Changed"
+        statements.clear()
+        self.assertEqual(db.get_card_by_id(100000).name, "Test Dragon 0")
+        self.assertEqual(statements, [])
+        self.assertEqual(
+            db.card_cache.stats, {"hits": 1, "misses": 1, "size": 1, "maxsize": 4}
+        )
+
+        # Only the ids that miss are queried, in one statement
+        ids = [100000, 100007, 100014]
+        self.assertEqual([card.id for card in db.get_cards_by_ids(ids)], ids)
+        self.assertEqual(len(statements), 1)
+        statements.clear()
+        self.assertEqual([card.id for card in db.get_cards_by_ids(ids)], ids)
+        self.assertEqual(statements, [])
+
+        # The least recently used cards are evicted first
+        db.get_cards_by_ids([100021, 100028])
+        self.assertEqual(len(db.card_cache), 4)
+        self.assertNotIn(100000, db.card_cache)
+        self.assertIn(100007, db.card_cache)
+
+        # Writes evict the cards they change, refresh drops everything
+        card = db.get_card_by_id(100007)
+        card.name = "Written once"
+        db.write_card_to_database(card)
+        self.assertEqual(db.get_card_by_id(100007).name, "Written once")
+        card.name = "Written twice"
+        db.write_cards_to_database([card])
+        self.assertEqual(db.get_card_by_id(100007).name, "Written twice")
+
+        path = self.path("cards.jsonl")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(json.dumps(dict(card.to_dict(), name="Imported")) + "\n")
+        db.import_cards(path)
+        self.assertEqual(db.get_card_by_id(100007).name, "Imported")
+
+        db.refresh()
+        self.assertEqual(len(db.card_cache), 0)
+
 
 if __name__ == "__main__":
     main()